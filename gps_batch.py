@@ -0,0 +1,143 @@
+# Пакетная обработка многих полётов одной командой, без вопросов в консоли.
+# Пары .log/.data находятся по одинаковому имени файла, каждая пара обрабатывается
+# в отдельном процессе, в конце печатается таблица по полётам и общая скорость.
+import os  # Для путей и числа ядер
+import glob  # Для поиска файлов по шаблону
+import time  # Для замера времени
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+from concurrent.futures import ProcessPoolExecutor  # Для работы на всех ядрах
+
+from gps_session import FlightSession  # Чтение пары файлов (с кэшем)
+from gps_map import MAP_MODES  # Режимы карты 2D
+from gps_kml import add_kml_arguments, kml_options_from_args  # Настройки записи KML/KMZ
+from gps_track import add_track_arguments, track_options_from_args  # Упрощение и линия трека
+from gps_metrics import recorder, add_metrics_arguments, configure_from_args  # Замеры по этапам
+from gps_data_visualization import perform_save  # Сохранение результатов
+
+
+# БЛОК 1: Поиск пар файлов
+# Шаблон — папка (берутся все .log и .data в ней) или маска вида "полёты/*/*"
+def find_flight_pairs(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files += glob.glob(os.path.join(pattern, '*.log')) + glob.glob(os.path.join(pattern, '*.data'))
+        else:
+            files += glob.glob(pattern)
+    logs = {}
+    datas = {}
+    for path in sorted(set(files)):
+        stem, extension = os.path.splitext(path)
+        if extension == '.log':
+            logs[stem] = path
+        elif extension == '.data':
+            datas[stem] = path
+    for stem in sorted(set(logs) ^ set(datas)):
+        logging.warning(f"Нет пары для файла '{logs.get(stem) or datas.get(stem)}', пропускаем.")
+    pairs = []
+    names = set()
+    for stem in sorted(set(logs) & set(datas)):
+        name = os.path.basename(stem)
+        number = 2
+        while name in names:  # Одинаковые имена в разных папках
+            name = f"{os.path.basename(stem)}_{number}"
+            number += 1
+        names.add(name)
+        pairs.append((name, logs[stem], datas[stem]))
+    return pairs
+
+
+# БЛОК 2: Обработка одного полёта (выполняется в процессе из пула)
+def process_flight(name, log_file, data_file, min_frequency, max_frequency, min_power_db, actions,
+                   output_dir, interpolate=False, use_cache=True, map_mode=None, kml_options=None,
+                   track_options=None, draw_track=False):
+    started = time.perf_counter()
+    recorder.reset()  # Процесс из пула обрабатывает полёты по очереди — замеры только этого полёта
+    result = {"name": name, "status": "ошибка", "gps": 0, "lines": 0, "matched": 0, "points": 0,
+              "bytes": os.path.getsize(data_file) if os.path.isfile(data_file) else 0, "seconds": 0.0}
+    try:
+        session = FlightSession.load(log_file, data_file, interpolate, use_cache, track_options)
+        if session is not None:
+            filtered_data_points, filtered_lines = session.filter(min_frequency, max_frequency, min_power_db)
+            flight_dir = os.path.join(output_dir, name)
+            os.makedirs(flight_dir, exist_ok=True)
+            perform_save(filtered_data_points, filtered_lines, None, min_frequency, max_frequency, min_power_db,
+                         actions, output_dir=flight_dir, kml_options=kml_options, map_mode=map_mode,
+                         track=session.track_line() if draw_track else None)
+            result.update(status="готово", gps=len(session.gps_time), lines=len(session.data_time),
+                          matched=int(session.matched.sum()), points=len(filtered_data_points))
+    except Exception as e:
+        logging.error(f"Ошибка при обработке полёта '{name}': {e}")
+        result["status"] = f"ошибка: {e}"
+    result["seconds"] = time.perf_counter() - started
+    result["metrics"] = recorder.stages
+    return result
+
+
+# БЛОК 3: Запуск пула и итоговая таблица
+def run_batch(pairs, min_frequency, max_frequency, min_power_db, actions, output_dir, workers=None,
+              interpolate=False, use_cache=True, map_mode=None, kml_options=None, track_options=None,
+              draw_track=False):
+    workers = workers or os.cpu_count() or 1
+    logging.info(f"Пакетная обработка: {len(pairs)} полётов, процессов: {workers}.")
+    print(f"Пакетная обработка: {len(pairs)} полётов, процессов: {workers}.")
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_flight, name, log_file, data_file, min_frequency, max_frequency,
+                               min_power_db, actions, output_dir, interpolate, use_cache, map_mode, kml_options,
+                               track_options, draw_track)
+                   for name, log_file, data_file in pairs]
+        results = [future.result() for future in futures]
+    for result in results:
+        recorder.extend(result["metrics"], prefix=result["name"])
+    total_seconds = time.perf_counter() - started
+    print_summary(results, total_seconds)
+    return results
+
+
+def print_summary(results, total_seconds):
+    header = f"{'Полёт':<24} {'GPS':>8} {'Строк':>10} {'Сопост.':>10} {'Точек':>8} {'Время, с':>9} {'Строк/с':>10}  Статус"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        speed = r["lines"] / r["seconds"] if r["seconds"] > 0 else 0.0
+        print(f"{r['name'][:24]:<24} {r['gps']:>8} {r['lines']:>10} {r['matched']:>10} {r['points']:>8} "
+              f"{r['seconds']:>9.2f} {speed:>10.0f}  {r['status']}")
+    print("-" * len(header))
+    total_lines = sum(r["lines"] for r in results)
+    total_mb = sum(r["bytes"] for r in results) / 1_000_000
+    done = sum(1 for r in results if r["status"] == "готово")
+    if total_seconds > 0:
+        print(f"Итого: {done} из {len(results)} полётов, {total_lines} строк за {total_seconds:.2f} с — "
+              f"{total_lines / total_seconds:.0f} строк/с, {total_mb / total_seconds:.1f} МБ/с.")
+
+
+# БЛОК 4: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетная обработка пар .log/.data на всех ядрах.")
+    parser.add_argument("inputs", nargs='+', help="папки или шаблоны файлов (например, 'полёты/*')")
+    parser.add_argument("--min-freq", type=int, required=True, help="минимальная частота, МГц")
+    parser.add_argument("--max-freq", type=int, required=True, help="максимальная частота, МГц")
+    parser.add_argument("--min-power", type=float, required=True, help="минимальная мощность, дБ")
+    parser.add_argument("--actions", default="2,3,4", help="номера действий через запятую: 2 — .data, 3 — KML, 4 — HTML, 6 — таблица")
+    parser.add_argument("--output-dir", default="batch_results", help="папка для результатов (по подпапке на полёт)")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — число ядер)")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    parser.add_argument("--map-mode", choices=MAP_MODES, default=None, help="режим карты HTML (по умолчанию 'auto')")
+    parser.add_argument("--no-cache", action="store_true", help="не читать и не писать кэш разобранных файлов")
+    add_kml_arguments(parser)
+    add_track_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.min_freq > args.max_freq:
+        parser.error("Максимальная частота должна быть не меньше минимальной.")
+    configure_from_args(args)
+    flight_pairs = find_flight_pairs(args.inputs)
+    if not flight_pairs:
+        print("Не найдено ни одной пары файлов .log и .data.")
+    else:
+        chosen = [a for a in args.actions.replace(',', ' ').split() if a in ('2', '3', '4', '6')]
+        run_batch(flight_pairs, args.min_freq, args.max_freq, args.min_power, chosen, args.output_dir,
+                  args.workers, args.interpolate, not args.no_cache, args.map_mode, kml_options_from_args(args),
+                  track_options_from_args(args), args.draw_track)
@@ -0,0 +1,155 @@
+# Замер скорости обработки на искусственных полётах разной длины, без вопросов в консоли.
+# Для каждого размера создаётся пара файлов (gps_synth.py), затем по очереди замеряются
+# разбор, сопоставление, отбор, создание карты и каждое действие сохранения.
+# Каждый размер считается в отдельном процессе, чтобы пик памяти относился только к нему.
+# Результаты пишутся в JSON; сравнение с прошлым файлом показывает, что стало медленнее.
+import io  # Для скрытия вывода действий сохранения
+import os  # Для путей
+import sys  # Для версии Python
+import json  # Для файла результатов
+import time  # Для замера времени
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+import platform  # Для описания машины
+import tempfile  # Для папки с искусственными файлами
+import tracemalloc  # Чтобы замер шёл без трассировки памяти
+import contextlib  # Для скрытия вывода действий сохранения
+from datetime import datetime  # Для даты замера
+from concurrent.futures import ProcessPoolExecutor  # Для отдельного процесса на размер
+
+import numpy as np  # Для версии NumPy
+
+from gps_synth import generate_flight, SYNTH_GPS_RATE_HZ, SYNTH_DATA_RATE_HZ, SYNTH_POWER_COLUMNS
+from gps_session import FlightSession, read_flight_files
+from gps_map import build_map
+from gps_data_visualization import perform_save
+from gps_metrics import peak_rss_mb, recorder  # Пик памяти процесса и замеры этапов изнутри
+
+# БЛОК 1: Настройки
+BENCH_DURATIONS = (60, 600, 3600)  # Длительности полётов по умолчанию, с
+BENCH_FILTER = (0, 3000, -40.0)  # Мин. частота, макс. частота, мин. мощность
+BENCH_SAVE_ACTIONS = ('2', '3', '4')  # Действия сохранения, каждое замеряется отдельно
+BENCH_REGRESSION_RATIO = 1.2  # Во сколько раз медленнее считается ухудшением
+
+
+# БЛОК 2: Замер одного размера (выполняется в отдельном процессе)
+def run_size(duration_sec, gps_rate_hz, data_rate_hz, power_columns, interpolate=False, seed=0):
+    logging.getLogger().setLevel(logging.WARNING)  # Сообщения о ходе работы не мешают замеру
+    stages = {}
+    with tempfile.TemporaryDirectory(prefix="gps_bench_") as work_dir:
+        log_file = os.path.join(work_dir, "flight.log")
+        data_file = os.path.join(work_dir, "flight.data")
+        counts = generate_flight(log_file, data_file, duration_sec, gps_rate_hz, data_rate_hz, power_columns,
+                                 seed=seed)
+        lines = counts["data_lines"]
+        # Подробные этапы (чтение GPS, разбор данных и т. д.) пишутся всегда и только для этого размера,
+        # но без tracemalloc: он в разы замедляет этапы, и замер не совпал бы с настоящей скоростью
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()  # Мог включиться через GPS_METRICS_MEMORY при импорте
+        recorder.enable(memory=False)
+        recorder.reset()
+
+        def timed(name, function, *args, **kwargs):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = function(*args, **kwargs)
+            seconds = time.perf_counter() - started
+            stages[name] = {"seconds": seconds, "lines_per_sec": lines / seconds if seconds > 0 else None,
+                            "peak_rss_mb": peak_rss_mb()}
+            return result
+
+        min_frequency, max_frequency, min_power_db = BENCH_FILTER
+        columns = timed("parse", read_flight_files, log_file, data_file)
+        session = timed("match", FlightSession.from_columns, columns, interpolate)
+        filtered_data_points, filtered_lines = timed("filter", session.filter, min_frequency, max_frequency, min_power_db)
+        m = timed("map", build_map, filtered_data_points, min_frequency, max_frequency, min_power_db)
+        for action in BENCH_SAVE_ACTIONS:
+            timed(f"save_{action}", perform_save, filtered_data_points, filtered_lines, m, min_frequency,
+                  max_frequency, min_power_db, [action], output_dir=work_dir)
+        data_bytes = os.path.getsize(data_file)
+    return {"duration_sec": duration_sec, "gps_fixes": counts["gps_fixes"], "data_lines": lines,
+            "data_bytes": data_bytes, "points": len(filtered_data_points), "stages": stages,
+            "metrics": recorder.stages}
+
+
+def run_benchmark(durations=BENCH_DURATIONS, gps_rate_hz=SYNTH_GPS_RATE_HZ, data_rate_hz=SYNTH_DATA_RATE_HZ,
+                  power_columns=SYNTH_POWER_COLUMNS, interpolate=False, seed=0):
+    results = []
+    for duration_sec in durations:
+        logging.info(f"Замер полёта длительностью {duration_sec} с...")
+        print(f"Замер полёта длительностью {duration_sec} с...")
+        with ProcessPoolExecutor(max_workers=1) as pool:  # Новый процесс — свой пик памяти
+            results.append(pool.submit(run_size, duration_sec, gps_rate_hz, data_rate_hz, power_columns,
+                                       interpolate, seed).result())
+    return {
+        "date": datetime.now().isoformat(timespec='seconds'),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "params": {"gps_rate_hz": gps_rate_hz, "data_rate_hz": data_rate_hz, "power_columns": power_columns,
+                   "interpolate": interpolate, "seed": seed, "filter": list(BENCH_FILTER)},
+        "results": results,
+    }
+
+
+# БЛОК 3: Вывод и сравнение
+def print_report(report):
+    for result in report["results"]:
+        print(f"\nПолёт {result['duration_sec']} с: {result['data_lines']} строк данных, "
+              f"{result['gps_fixes']} точек GPS, отобрано {result['points']} точек")
+        print(f"{'Этап':<10} {'Время, с':>10} {'Строк/с':>12} {'Пик процесса, МБ':>16}")
+        for name, stage in result["stages"].items():
+            speed = f"{stage['lines_per_sec']:.0f}" if stage['lines_per_sec'] else "-"
+            rss = f"{stage['peak_rss_mb']:.1f}" if stage['peak_rss_mb'] is not None else "-"
+            print(f"{name:<10} {stage['seconds']:>10.3f} {speed:>12} {rss:>16}")
+
+
+# Сравнение времени этапов с прошлым замером при тех же длительностях; возвращает число ухудшений
+def compare_reports(old_report, new_report, ratio=BENCH_REGRESSION_RATIO):
+    old_results = {result["duration_sec"]: result for result in old_report["results"]}
+    regressions = 0
+    print(f"\nСравнение с замером от {old_report.get('date', '?')}:")
+    for result in new_report["results"]:
+        old = old_results.get(result["duration_sec"])
+        if old is None:
+            continue
+        for name, stage in result["stages"].items():
+            old_stage = old["stages"].get(name)
+            if not old_stage or old_stage["seconds"] <= 0:
+                continue
+            change = stage["seconds"] / old_stage["seconds"]
+            mark = ""
+            if change >= ratio:
+                mark = "  <-- медленнее"
+                regressions += 1
+            print(f"{result['duration_sec']:>6} с {name:<10} {old_stage['seconds']:>9.3f} -> {stage['seconds']:>9.3f} с "
+                  f"({change:.2f}x){mark}")
+    if regressions:
+        logging.warning(f"Найдено ухудшений скорости: {regressions}.")
+    print(f"Ухудшений скорости: {regressions}.")
+    return regressions
+
+
+# БЛОК 4: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер скорости обработки на искусственных полётах.")
+    parser.add_argument("--durations", default=",".join(map(str, BENCH_DURATIONS)),
+                        help="длительности полётов через запятую, с")
+    parser.add_argument("--gps-rate", type=float, default=SYNTH_GPS_RATE_HZ, help="точек GPS в секунду")
+    parser.add_argument("--data-rate", type=float, default=SYNTH_DATA_RATE_HZ, help="строк данных в секунду")
+    parser.add_argument("--power-columns", type=int, default=SYNTH_POWER_COLUMNS, help="значений мощности в строке")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    parser.add_argument("--seed", type=int, default=0, help="начальное значение генератора случайных чисел")
+    parser.add_argument("--output", default="bench_results.json", help="файл JSON для результатов")
+    parser.add_argument("--compare", default=None, help="файл JSON прошлого замера для сравнения")
+    args = parser.parse_args()
+    durations = [float(d) for d in args.durations.replace(',', ' ').split()]
+    report = run_benchmark(durations, args.gps_rate, args.data_rate, args.power_columns, args.interpolate, args.seed)
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f"Результаты замера сохранены в файл: {args.output}")
+    print(f"\nРезультаты замера сохранены в файл: {args.output}")
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare_reports(json.load(f), report)
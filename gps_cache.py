@@ -0,0 +1,95 @@
+# Кэш разобранных файлов .log и .data рядом с файлом данных.
+# Столбцы хранятся как файлы .npy и открываются через отображение в память (mmap), без разбора текста.
+# Кэш привязан к путям, размерам и времени изменения обоих файлов и сам устаревает при их изменении.
+import os  # Для путей и сведений о файлах
+import json  # Для описания кэша
+import shutil  # Для удаления устаревшего кэша
+import logging  # Для записи логов
+
+import numpy as np  # Для файлов .npy
+
+# БЛОК 1: Настройки кэша
+CACHE_DIR_SUFFIX = ".cache"  # Папка кэша: <файл данных>.cache
+CACHE_META_FILE = "meta.json"  # Описание: ключ исходных файлов и скалярные значения
+CACHE_FORMAT_VERSION = 1  # Увеличивается при изменении состава столбцов
+CACHE_ARRAYS = ("gps_times_us", "gps_coords", "data_times", "freq_min", "freq_max", "powers")
+
+
+# БЛОК 2: Ключ кэша
+def cache_dir_for(data_file):
+    return data_file + CACHE_DIR_SUFFIX
+
+
+# Путь, размер и время изменения файла
+def _source_key(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def make_cache_key(log_file, data_file):
+    return {"version": CACHE_FORMAT_VERSION, "log": _source_key(log_file), "data": _source_key(data_file)}
+
+
+# Ключ до чтения файлов или None, если какого-то файла нет
+def source_cache_key(log_file, data_file):
+    try:
+        return make_cache_key(log_file, data_file)
+    except OSError:
+        return None
+
+
+# Файлы не менялись с момента, когда был взят ключ key
+def _sources_unchanged(log_file, data_file, key):
+    return key is not None and source_cache_key(log_file, data_file) == key
+
+
+# БЛОК 3: Чтение и запись
+# Столбцы из кэша (массивы открыты через mmap) или None, если кэша нет или он устарел
+def load_cached_columns(log_file, data_file):
+    cache_dir = cache_dir_for(data_file)
+    meta_path = os.path.join(cache_dir, CACHE_META_FILE)
+    if not (os.path.isfile(meta_path) and os.path.isfile(log_file) and os.path.isfile(data_file)):
+        return None
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get("key") != make_cache_key(log_file, data_file):
+            logging.info(f"Кэш '{cache_dir}' устарел: исходные файлы изменились.")
+            return None
+        columns = {name: np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode='r') for name in CACHE_ARRAYS}
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Не удалось прочитать кэш '{cache_dir}': {e}")
+        return None
+    columns["first_valid_time"] = meta["first_valid_time"]
+    logging.info(f"Столбцы открыты из кэша '{cache_dir}'.")
+    return columns
+
+
+# Запись столбцов во временную папку и замена ею старого кэша. key — ключ, взятый до чтения файлов:
+# если файл менялся во время чтения (например, .data ещё пишется), столбцы не соответствуют ни старому,
+# ни новому содержимому, и кэш не сохраняется
+def save_cached_columns(log_file, data_file, columns, key):
+    cache_dir = cache_dir_for(data_file)
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    if not _sources_unchanged(log_file, data_file, key):
+        logging.info(f"Кэш '{cache_dir}' не сохранён: исходные файлы менялись во время чтения.")
+        return False
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in CACHE_ARRAYS:
+            np.save(os.path.join(tmp_dir, name + ".npy"), np.ascontiguousarray(columns[name]))
+        with open(os.path.join(tmp_dir, CACHE_META_FILE), 'w') as f:
+            json.dump({"key": key, "first_valid_time": columns["first_valid_time"]}, f)
+        if not _sources_unchanged(log_file, data_file, key):  # Файлы могли измениться, пока писался кэш
+            logging.info(f"Кэш '{cache_dir}' не сохранён: исходные файлы менялись во время записи.")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+        logging.info(f"Кэш сохранён в '{cache_dir}'.")
+        return True
+    except OSError as e:
+        logging.warning(f"Не удалось сохранить кэш '{cache_dir}': {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
@@ -0,0 +1,192 @@
+# Табличная выгрузка сопоставленных измерений: Parquet или Arrow IPC (нужен pyarrow), иначе CSV.
+# Строка таблицы — одно измерение: время, координаты, частоты, максимальная мощность, список мощностей
+# выше порога и номера их полос в строке мощностей (bins, с нуля). Данные пишутся порциями прямо из массивов, каждая порция — отдельная группа строк Parquet,
+# поэтому чтение только нужных столбцов и отбор по статистике групп (время, частоты, мощность) обходятся дёшево.
+import os  # Для путей
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+
+import numpy as np  # Для столбцов
+
+try:
+    import pyarrow as pa  # Для Parquet и Arrow IPC
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None  # Без pyarrow остаётся CSV
+    pq = None
+
+from gps_session import FlightSession  # Чтение пары файлов
+from gps_metrics import stage, count, add_metrics_arguments, configure_from_args  # Замеры по этапам
+
+# БЛОК 1: Настройки
+COLUMNAR_FORMATS = ('parquet', 'arrow', 'csv')
+COLUMNAR_FORMAT = 'parquet'  # Формат по умолчанию
+COLUMNAR_EXTENSIONS = {'parquet': ".parquet", 'arrow': ".arrow", 'csv': ".csv"}
+COLUMNAR_BATCH_ROWS = 65536  # Строк в одной порции (группе строк Parquet)
+COLUMNAR_COMPRESSION = 'zstd'  # Сжатие Parquet
+CSV_HEADER = "timestamp,lat,lon,alt,freq_min,freq_max,max_power,powers,bins\n"
+
+
+# Формат, который получится на самом деле: без pyarrow — CSV
+def resolve_format(fmt=None):
+    fmt = fmt or COLUMNAR_FORMAT
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Неизвестный формат таблицы: '{fmt}'. Возможные: {', '.join(COLUMNAR_FORMATS)}.")
+    if fmt != 'csv' and pa is None:
+        return 'csv'
+    return fmt
+
+
+def columnar_filename(base_filename, fmt=None):
+    return base_filename + COLUMNAR_EXTENSIONS[resolve_format(fmt)]
+
+
+# БЛОК 2: Запись порциями
+class ColumnarWriter:
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = resolve_format(fmt)
+        if self.format != (fmt or COLUMNAR_FORMAT):
+            logging.warning(f"pyarrow не установлена, вместо '{fmt or COLUMNAR_FORMAT}' таблица сохраняется в CSV.")
+        self.rows = 0
+        self._writer = None
+        self._file = None
+        if self.format == 'csv':
+            self._file = open(path, 'w')
+            self._file.write(CSV_HEADER)
+        else:
+            self.schema = pa.schema([
+                ("timestamp", pa.timestamp('us')),
+                ("lat", pa.float64()),
+                ("lon", pa.float64()),
+                ("alt", pa.float64()),
+                ("freq_min", pa.int64()),
+                ("freq_max", pa.int64()),
+                ("max_power", pa.float64()),
+                ("powers", pa.list_(pa.float64())),
+                ("bins", pa.list_(pa.int32())),
+            ])
+            if self.format == 'parquet':
+                self._writer = pq.ParquetWriter(path, self.schema, compression=COLUMNAR_COMPRESSION)
+            else:
+                self._file = pa.OSFile(path, 'wb')
+                self._writer = pa.ipc.new_file(self._file, self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Порция строк: powers — матрица с NaN-дополнением, above — какие значения выше порога
+    def write_arrays(self, timestamps, coords, freq_min, freq_max, powers, above):
+        n = len(timestamps)
+        if n == 0:
+            return
+        counts = above.sum(axis=1)
+        values = powers[above]  # По строкам, слева направо — как в отобранном .data
+        bins = np.nonzero(above)[1].astype(np.int32)  # Номер полосы каждого значения в том же порядке
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+        max_power = np.where(above, powers, -np.inf).max(axis=1)
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        if self.format == 'csv':
+            stamps = np.datetime_as_string(np.asarray(timestamps, dtype='datetime64[us]'), unit='us')
+            self._file.writelines(
+                f"{stamp},{lat!r},{lon!r},{alt!r},{fmin},{fmax},{pmax!r},{' '.join(f'{p:.1f}' for p in values[start:end].tolist())},"
+                f"{' '.join(map(str, bins[start:end].tolist()))}\n"
+                for stamp, lat, lon, alt, fmin, fmax, pmax, start, end in zip(
+                    stamps, coords[:, 0].tolist(), coords[:, 1].tolist(),
+                    coords[:, 2].tolist(), freq_min.tolist(), freq_max.tolist(), max_power.tolist(),
+                    offsets[:-1].tolist(), offsets[1:].tolist()))
+        else:
+            batch = pa.record_batch([
+                pa.array(np.asarray(timestamps, dtype='datetime64[us]')),
+                pa.array(coords[:, 0]),
+                pa.array(coords[:, 1]),
+                pa.array(coords[:, 2]),
+                pa.array(freq_min, type=pa.int64()),
+                pa.array(freq_max, type=pa.int64()),
+                pa.array(max_power),
+                pa.ListArray.from_arrays(pa.array(offsets), pa.array(values, type=pa.float64())),
+                pa.ListArray.from_arrays(pa.array(offsets), pa.array(bins, type=pa.int32())),
+            ], schema=self.schema)
+            if self.format == 'parquet':
+                self._writer.write_table(pa.Table.from_batches([batch]), row_group_size=n)
+            else:
+                self._writer.write_batch(batch)
+        self.rows += n
+
+    # Порция из отобранных точек (словари make_point); мощности в них уже выше порога и стоят
+    # на своих полосах bins (без bins — подряд с нуля)
+    def write_points(self, points):
+        bins = [data.get('bins') or range(len(data['powers'])) for data in points]
+        width = max((max(row_bins, default=-1) + 1 for row_bins in bins), default=0)
+        powers = np.full((len(points), width), np.nan)
+        for row, data in enumerate(points):
+            powers[row, list(bins[row])] = data['powers']
+        self.write_arrays(np.array([data['timestamp'] for data in points], dtype='datetime64[us]'),
+                          np.array([data['coords'] for data in points], dtype=np.float64).reshape(-1, 3),
+                          np.array([data['freq_min'] for data in points], dtype=np.int64),
+                          np.array([data['freq_max'] for data in points], dtype=np.int64),
+                          powers, ~np.isnan(powers))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# БЛОК 3: Выгрузка
+# Из готовых точек (действие сохранения в perform_save), порциями по COLUMNAR_BATCH_ROWS
+def export_points(filtered_data_points, path, fmt=None):
+    with ColumnarWriter(path, fmt) as writer:
+        for start in range(0, len(filtered_data_points), COLUMNAR_BATCH_ROWS):
+            writer.write_points(filtered_data_points[start:start + COLUMNAR_BATCH_ROWS])
+    return writer.rows
+
+
+# Прямо из массивов сессии, без создания точек: быстрый путь для больших полётов
+def export_session(session, path, min_frequency, max_frequency, min_power_db, fmt=None):
+    mask, above = session.filter_mask(min_frequency, max_frequency, min_power_db)
+    rows = np.flatnonzero(mask)
+    start_us = np.datetime64(session.first_gps_time, 'us')
+    with ColumnarWriter(path, fmt) as writer:
+        for start in range(0, len(rows), COLUMNAR_BATCH_ROWS):
+            batch = rows[start:start + COLUMNAR_BATCH_ROWS]
+            timestamps = start_us + np.round(session.data_time[batch] * 1_000_000).astype('timedelta64[us]')
+            writer.write_arrays(timestamps, session.match_coords[batch], session.freq_min[batch],
+                                session.freq_max[batch], session.powers[batch], above[batch])
+    return writer.rows
+
+
+# БЛОК 4: Запуск из терминала
+if __name__ == "__main__":
+    from gps_data_visualization import make_base_filename  # Имена файлов как у остальных результатов
+
+    parser = argparse.ArgumentParser(description="Табличная выгрузка сопоставленных измерений (Parquet, Arrow IPC или CSV).")
+    parser.add_argument("log_file", help="файл журнала GPS (.log)")
+    parser.add_argument("data_file", help="файл данных (.data)")
+    parser.add_argument("--min-freq", type=int, required=True, help="минимальная частота, МГц")
+    parser.add_argument("--max-freq", type=int, required=True, help="максимальная частота, МГц")
+    parser.add_argument("--min-power", type=float, required=True, help="минимальная мощность, дБ")
+    parser.add_argument("--format", choices=COLUMNAR_FORMATS, default=COLUMNAR_FORMAT, help="формат таблицы")
+    parser.add_argument("--output-dir", default=".", help="папка для результатов")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    parser.add_argument("--no-cache", action="store_true", help="не читать и не писать кэш разобранных файлов")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.min_freq > args.max_freq:
+        parser.error("Максимальная частота должна быть не меньше минимальной.")
+    configure_from_args(args)
+    flight = FlightSession.load(args.log_file, args.data_file, args.interpolate, not args.no_cache)
+    if flight is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+        table_file = columnar_filename(os.path.join(args.output_dir, make_base_filename(args.min_freq, args.max_freq, args.min_power)), args.format)
+        with stage("columnar_export"):
+            written = export_session(flight, table_file, args.min_freq, args.max_freq, args.min_power, args.format)
+            count("rows", written)
+        logging.info(f"Таблица сохранена в файл: {table_file} ({written} строк).")
+        print(f"Таблица сохранена в файл: {table_file} ({written} строк).")
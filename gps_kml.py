@@ -0,0 +1,151 @@
+# Потоковая запись KML/KMZ: метки пишутся в файл сразу, без объекта на каждую точку.
+# Время записи растёт линейно с числом точек, а память не растёт: папки по диапазонам частот
+# и путь по отобранным точкам копятся во временных файлах и переносятся в документ при закрытии.
+import shutil  # Для копирования временных файлов в документ
+import zipfile  # Для KMZ
+import tempfile  # Для временных файлов папок и трека
+from xml.sax.saxutils import escape  # Для текста внутри KML
+
+# БЛОК 1: Настройки
+KML_TRACK_MODES = ('gx', 'line')  # Путь по отобранным точкам: gx:Track (с временем) или LineString
+KMZ_DOC_NAME = "doc.kml"  # Имя документа внутри KMZ
+KML_HITS_PATH_NAME = "Путь по отобранным точкам"  # Не трек полёта: соединяет только точки выше порога
+KML_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n'
+              '    <Document>\n')
+KML_FOOTER = '    </Document>\n</kml>\n'
+
+
+# БЛОК 2: Запись документа
+class KmlWriter:
+    def __init__(self, path, kmz=False, group_by_band=False, track=None, name=None):
+        if track not in (None,) + KML_TRACK_MODES:
+            raise ValueError(f"Неизвестный вид трека: '{track}'. Возможные: {', '.join(KML_TRACK_MODES)}.")
+        self.path = path
+        self.kmz = kmz
+        self.group_by_band = group_by_band
+        self.track = track
+        self.count = 0
+        self._zip = None
+        if kmz:
+            self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+            self._raw = self._zip.open(KMZ_DOC_NAME, 'w', force_zip64=True)
+        else:
+            self._raw = open(path, 'wb')
+        self._out = _Utf8Stream(self._raw)
+        self._bands = {}  # Диапазон частот -> временный файл с метками папки
+        self._track_file = tempfile.TemporaryFile('w+', encoding='utf-8') if track else None
+        # В gx:Track сначала идут все <when>, потом все <gx:coord>, поэтому координаты копятся отдельно
+        self._coord_file = tempfile.TemporaryFile('w+', encoding='utf-8') if track == 'gx' else None
+        self._out.write(KML_HEADER)
+        if name:
+            self._out.write(f'        <name>{escape(name)}</name>\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Одна точка: метка в документ (или в папку своего диапазона) и узел пути
+    def add_point(self, number, point, description):
+        lat, lon, alt = point['coords']
+        placemark = (f'        <Placemark>\n'
+                     f'            <name>Точка {number}</name>\n'
+                     f'            <description>{escape(description)}</description>\n'
+                     f'            <Point>\n'
+                     f'                <coordinates>{lon},{lat},{alt}</coordinates>\n'
+                     f'            </Point>\n'
+                     f'        </Placemark>\n')
+        if self.group_by_band:
+            band = (point['freq_min'], point['freq_max'])
+            if band not in self._bands:
+                self._bands[band] = tempfile.TemporaryFile('w+', encoding='utf-8')
+            self._bands[band].write(placemark)
+        else:
+            self._out.write(placemark)
+        if self.track == 'gx':
+            self._track_file.write(f'                <when>{point["timestamp"].strftime("%Y-%m-%dT%H:%M:%S.%fZ")}</when>\n')
+            self._coord_file.write(f'                <gx:coord>{lon} {lat} {alt}</gx:coord>\n')
+        elif self.track == 'line':
+            self._track_file.write(f'{lon},{lat},{alt} ')
+        self.count += 1
+
+    # Отдельная линия по готовым координатам (широта, долгота, высота)
+    def add_line(self, name, coords):
+        self._out.write(f'        <Placemark>\n'
+                        f'            <name>{escape(name)}</name>\n'
+                        f'            <LineString>\n'
+                        f'                <altitudeMode>absolute</altitudeMode>\n'
+                        f'                <coordinates>{" ".join(f"{lon},{lat},{alt}" for lat, lon, alt in coords)}</coordinates>\n'
+                        f'            </LineString>\n'
+                        f'        </Placemark>\n')
+
+    def _copy(self, temp_file):
+        temp_file.seek(0)
+        shutil.copyfileobj(temp_file, self._out)
+        temp_file.close()
+
+    def _write_folders(self):
+        for (freq_min, freq_max), temp_file in sorted(self._bands.items()):
+            self._out.write(f'        <Folder>\n'
+                            f'            <name>Частоты {freq_min}-{freq_max} МГц</name>\n')
+            self._copy(temp_file)
+            self._out.write('        </Folder>\n')
+        self._bands = {}
+
+    def _write_track(self):
+        if self.track == 'gx':
+            self._out.write('        <Placemark>\n'
+                            f'            <name>{KML_HITS_PATH_NAME}</name>\n'
+                            '            <gx:Track>\n'
+                            '                <altitudeMode>absolute</altitudeMode>\n')
+            self._copy(self._track_file)
+            self._copy(self._coord_file)
+            self._coord_file = None
+            self._out.write('            </gx:Track>\n'
+                            '        </Placemark>\n')
+        else:
+            self._out.write('        <Placemark>\n'
+                            f'            <name>{KML_HITS_PATH_NAME}</name>\n'
+                            '            <LineString>\n'
+                            '                <altitudeMode>absolute</altitudeMode>\n'
+                            '                <coordinates>')
+            self._copy(self._track_file)
+            self._out.write('</coordinates>\n'
+                            '            </LineString>\n'
+                            '        </Placemark>\n')
+        self._track_file = None
+
+    def close(self):
+        if self._raw is None:
+            return
+        self._write_folders()
+        if self._track_file is not None:
+            self._write_track()
+        self._out.write(KML_FOOTER)
+        self._raw.close()
+        if self._zip is not None:
+            self._zip.close()
+        self._raw = None
+
+
+# Текст в UTF-8 поверх двоичного потока (файла или записи внутри KMZ)
+class _Utf8Stream:
+    def __init__(self, raw):
+        self._raw = raw
+
+    def write(self, text):
+        self._raw.write(text.encode('utf-8'))
+
+
+# БЛОК 3: Параметры для запуска из терминала
+def add_kml_arguments(parser):
+    parser.add_argument("--kmz", action="store_true", help="сохранять KMZ (сжатый KML) вместо KML")
+    parser.add_argument("--kml-folders", action="store_true", help="раскладывать точки KML по папкам диапазонов частот")
+    parser.add_argument("--kml-track", choices=KML_TRACK_MODES, default=None,
+                        help="добавить в KML путь по отобранным точкам: gx — gx:Track со временем, line — LineString")
+
+
+def kml_options_from_args(args):
+    return {"kmz": args.kmz, "group_by_band": args.kml_folders, "track": args.kml_track}
@@ -0,0 +1,298 @@
+# Слежение за файлами .log и .data, которые ещё пишутся во время полёта.
+# Новые строки дочитываются по мере появления, точки GPS держатся в скользящем окне,
+# а измерение сопоставляется, как только пришла точка GPS не раньше него по времени.
+# Отобранные точки сразу дописываются в выходные файлы, карта HTML периодически обновляется.
+import os  # Для путей и замены файла карты
+import time  # Для пауз между чтениями
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+from collections import deque  # Для окна точек GPS и очереди измерений
+from datetime import timedelta  # Для времени измерений
+
+import numpy as np  # Для масок по новым строкам
+import folium  # Для автообновления страницы карты
+
+from gps_matcher import GpsTimeIndex, MATCH_TOLERANCE_SEC  # Сопоставление по времени
+from gps_session import (GPS_BASE_DATE, parse_gps_line, find_first_valid_time, parse_data_block,
+                         filter_rows, make_point, format_filtered_line)
+from gps_map import MAP_MODES, build_map  # Карта 2D
+from gps_kml import add_kml_arguments, kml_options_from_args  # Настройки записи KML/KMZ
+from gps_stream import make_sinks  # Приёмники точек: консоль, .data, KML
+from gps_data_visualization import MAP_FILE_EXTENSION, make_base_filename
+
+# БЛОК 1: Настройки
+LIVE_POLL_SEC = 1.0  # Пауза между проверками файлов, с
+LIVE_MAP_REFRESH_SEC = 10.0  # Как часто пересохраняется карта, с
+LIVE_MAX_PENDING = 100_000  # Сколько измерений может ждать точку GPS, остальные сопоставляются по тому, что есть
+LIVE_MAP_MAX_POINTS = 50_000  # Сколько последних точек держится для карты
+LIVE_READ_BYTES = 4 * 1024 * 1024  # Сколько байт файла читается за один раз
+LIVE_ENCODING = 'utf-8'  # Кодировка файлов
+
+
+# БЛОК 2: Дочитывание растущего файла
+# Отдаёт только целые строки; незаконченная последняя строка ждёт следующего чтения
+class FileTail:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self._rest = b''
+
+    def read_lines(self):
+        if self.file is None:
+            if not os.path.isfile(self.path):
+                return []  # Файл ещё не создан
+            self.file = open(self.path, 'rb')
+        chunk = self.file.read(LIVE_READ_BYTES)
+        if not chunk:
+            return []
+        parts = (self._rest + chunk).split(b'\n')
+        self._rest = parts.pop()
+        return [part.rstrip(b'\r').decode(LIVE_ENCODING, errors='replace') for part in parts]
+
+    # Хвост без перевода строки — при завершении, когда файл больше не пишется
+    def read_rest(self):
+        lines = []
+        while True:
+            position = self.file.tell() if self.file is not None else 0
+            lines += self.read_lines()
+            if self.file is None or self.file.tell() == position:
+                break  # Файл дочитан до конца
+        if self._rest:
+            lines.append(self._rest.rstrip(b'\r').decode(LIVE_ENCODING, errors='replace'))
+            self._rest = b''
+        return lines
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# БЛОК 3: Скользящее окно точек GPS
+# Время — в секундах от первой точки журнала, как в GpsTimeIndex.from_fixes
+class RollingGpsIndex:
+    def __init__(self):
+        self.first_us = None
+        self.fixes = deque()  # (время, координаты) по возрастанию времени
+
+    def __len__(self):
+        return len(self.fixes)
+
+    def add(self, time_us, coords):
+        if self.first_us is None:
+            self.first_us = time_us
+        fix = ((time_us - self.first_us) / 1_000_000, coords)
+        if not self.fixes or fix[0] >= self.fixes[-1][0]:
+            self.fixes.append(fix)
+            return
+        position = len(self.fixes)  # Точка пришла не по порядку — ставим после равных по времени
+        while position > 0 and self.fixes[position - 1][0] > fix[0]:
+            position -= 1
+        self.fixes.insert(position, fix)
+
+    def latest_time(self):
+        return self.fixes[-1][0] if self.fixes else None
+
+    # Удаление точек, которые уже не понадобятся измерениям со временем не меньше watermark:
+    # остаётся только последняя серия точек раньше watermark (левый сосед) и всё, что позже
+    def evict(self, watermark):
+        fixes = self.fixes
+        below = 0
+        while below < len(fixes) and fixes[below][0] < watermark:
+            below += 1
+        if below == 0:
+            return
+        keep_time = fixes[below - 1][0]
+        while fixes[0][0] < keep_time:
+            fixes.popleft()
+
+    def snapshot(self):
+        return GpsTimeIndex([fix[0] for fix in self.fixes], [fix[1] for fix in self.fixes])
+
+
+# БЛОК 4: Живой отбор
+class LiveMatcher:
+    def __init__(self, min_frequency, max_frequency, min_power_db, sinks, interpolate=False,
+                 map_file=None, map_mode=None):
+        self.min_frequency = min_frequency
+        self.max_frequency = max_frequency
+        self.min_power_db = min_power_db
+        self.sinks = sinks
+        self.interpolate = interpolate
+        self.map_file = map_file
+        self.map_mode = map_mode
+        self.gps = RollingGpsIndex()
+        self.pending = deque()  # Отобранные по частоте и мощности измерения, ждущие GPS
+        self.map_points = deque(maxlen=LIVE_MAP_MAX_POINTS)
+        self.first_valid_time = None
+        self.latest_data_time = None  # Время последней разобранной строки данных, прошла она отбор или нет
+        self.data_line_count = 0
+        self.matches = 0
+        self.dropped = 0  # Измерения, отброшенные до первой точки GPS
+        self.map_dirty = False
+
+    def add_gps_lines(self, lines):
+        for line in lines:
+            fix = parse_gps_line(line)
+            if fix is not None:
+                self.gps.add(*fix)
+
+    def add_data_lines(self, lines):
+        line_number = self.data_line_count + 1
+        self.data_line_count += len(lines)
+        if self.first_valid_time is None:
+            first_valid_index, first_valid_time, _ = find_first_valid_time(lines, line_number)
+            if first_valid_index is None:
+                return
+            self.first_valid_time = first_valid_time
+            lines = lines[first_valid_index - line_number + 1:]
+            line_number = first_valid_index + 1
+        times, freq_mins, freq_maxs, powers = parse_data_block(lines, line_number)
+        if len(times):
+            block_latest = round(float(times.max()) - self.first_valid_time, 6)
+            if self.latest_data_time is None or block_latest > self.latest_data_time:
+                self.latest_data_time = block_latest
+        mask, above = filter_rows(True, freq_mins, freq_maxs, powers,
+                                  self.min_frequency, self.max_frequency, self.min_power_db)
+        for row in np.flatnonzero(mask):
+            relative_time = float(times[row]) - self.first_valid_time
+            self.pending.append((relative_time, int(freq_mins[row]), int(freq_maxs[row]),
+                                 powers[row][above[row]].tolist(), np.flatnonzero(above[row]).tolist()))
+
+    # Сопоставление готовых измерений: для них уже есть точка GPS не раньше по времени,
+    # поэтому более поздние точки ничего не изменят. final — файлы больше не пишутся.
+    def process(self, final=False):
+        latest = self.gps.latest_time()
+        if latest is None:
+            if final:
+                self.pending.clear()  # Точек GPS так и не было
+            elif len(self.pending) > LIVE_MAX_PENDING:
+                if not self.dropped:
+                    logging.warning(f"Точек GPS ещё нет, ждут больше {LIVE_MAX_PENDING} измерений: самые старые отбрасываются.")
+                while len(self.pending) > LIVE_MAX_PENDING:
+                    self.pending.popleft()  # Сопоставить их не с чем
+                    self.dropped += 1
+            return 0
+        ready = []
+        while self.pending:
+            target = round(self.pending[0][0], 6)
+            if not (final or target <= latest or len(self.pending) > LIVE_MAX_PENDING):
+                break
+            ready.append(self.pending.popleft())
+        emitted = 0
+        if ready:
+            targets = np.round([item[0] for item in ready], 6)
+            match_idx, match_coords = self.gps.snapshot().match_many(targets, MATCH_TOLERANCE_SEC, self.interpolate)
+            first_gps_time = GPS_BASE_DATE + timedelta(seconds=self.gps.first_us / 1_000_000)
+            for k in np.flatnonzero(match_idx >= 0):
+                relative_time, freq_min, freq_max, valid_powers, bins = ready[k]
+                self.matches += 1
+                emitted += 1
+                point = make_point(tuple(match_coords[k].tolist()), first_gps_time + timedelta(seconds=relative_time),
+                                   freq_min, freq_max, valid_powers, bins)
+                line = format_filtered_line(relative_time, freq_min, freq_max, valid_powers)
+                for sink in self.sinks:
+                    sink.write(self.matches, point, line)
+                self.map_points.append(point)
+        # Окно GPS сдвигается по самому раннему ждущему измерению, а без них — по последней строке
+        # данных: при строгом отборе измерения проходят редко, но время данных всё равно идёт
+        if self.pending:
+            self.gps.evict(round(self.pending[0][0], 6))
+        elif self.latest_data_time is not None:
+            self.gps.evict(self.latest_data_time)
+        if emitted:
+            self.map_dirty = True
+            for sink in self.sinks:
+                sink.flush()  # Строки видны в файле сразу
+        return emitted
+
+    # Карта пишется во временный файл и заменяет старую целиком; страница сама обновляется
+    def refresh_map(self, refresh_sec=LIVE_MAP_REFRESH_SEC):
+        if self.map_file is None or not self.map_dirty:
+            return
+        m = build_map(list(self.map_points), self.min_frequency, self.max_frequency, self.min_power_db,
+                      self.map_mode)
+        m.get_root().header.add_child(folium.Element(f'<meta http-equiv="refresh" content="{int(refresh_sec)}">'))
+        temp_file = self.map_file + '.tmp'
+        m.save(temp_file)
+        os.replace(temp_file, self.map_file)
+        self.map_dirty = False
+        logging.info(f"Карта обновлена: {self.map_file} ({len(self.map_points)} точек).")
+
+
+# БЛОК 5: Слежение за файлами
+# Работает до Ctrl+C или до idle_timeout секунд без новых строк (None — без ограничения)
+def follow(log_file, data_file, min_frequency, max_frequency, min_power_db, actions, output_dir='.',
+           interpolate=False, map_mode=None, poll_sec=LIVE_POLL_SEC, refresh_sec=LIVE_MAP_REFRESH_SEC,
+           idle_timeout=None, kml_options=None):
+    os.makedirs(output_dir, exist_ok=True)
+    map_file = None
+    if '4' in actions or '5' in actions:  # 5 — всё, как в perform_save
+        map_file = os.path.join(output_dir, f"map_{make_base_filename(min_frequency, max_frequency, min_power_db)}{MAP_FILE_EXTENSION}")
+    sinks = make_sinks(actions, min_frequency, max_frequency, min_power_db, output_dir, kml_options)
+    matcher = LiveMatcher(min_frequency, max_frequency, min_power_db, sinks, interpolate, map_file, map_mode)
+    log_tail = FileTail(log_file)
+    data_tail = FileTail(data_file)
+    logging.info(f"Слежение за файлами '{log_file}' и '{data_file}'...")
+    print(f"Слежение за файлами '{log_file}' и '{data_file}' (Ctrl+C — остановить)...")
+    last_data = time.monotonic()
+    last_map = time.monotonic()
+    try:
+        while True:
+            gps_lines = log_tail.read_lines()  # Сначала GPS: новые точки могут закрыть ждущие измерения
+            data_lines = data_tail.read_lines()
+            matcher.add_gps_lines(gps_lines)
+            matcher.add_data_lines(data_lines)
+            if matcher.process():
+                print(f"Найдено точек: {matcher.matches}, ждут GPS: {len(matcher.pending)}, точек GPS в окне: {len(matcher.gps)}.")
+            now = time.monotonic()
+            if now - last_map >= refresh_sec:
+                matcher.refresh_map(refresh_sec)
+                last_map = now
+            if gps_lines or data_lines:
+                last_data = now  # Пока файлы дочитываются, без паузы
+                continue
+            if idle_timeout is not None and now - last_data >= idle_timeout:
+                logging.info("Файлы не растут, слежение завершено.")
+                print("Файлы не растут, слежение завершено.")
+                break
+            time.sleep(poll_sec)
+    except KeyboardInterrupt:
+        print("Слежение остановлено.")
+    finally:
+        # Недописанные последние строки и измерения без следующей точки GPS обрабатываются в конце
+        matcher.add_gps_lines(log_tail.read_rest())
+        matcher.add_data_lines(data_tail.read_rest())
+        matcher.process(final=True)
+        matcher.refresh_map(refresh_sec)
+        log_tail.close()
+        data_tail.close()
+        for sink in sinks:
+            sink.close()
+    logging.info(f"Найдено {matcher.matches} точек по параметрам отбора.")
+    print(f"Найдено {matcher.matches} точек по параметрам отбора.")
+    return matcher.matches
+
+
+# БЛОК 6: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отбор данных во время полёта: слежение за растущими .log и .data.")
+    parser.add_argument("log_file", help="файл журнала GPS (.log)")
+    parser.add_argument("data_file", help="файл данных (.data)")
+    parser.add_argument("--min-freq", type=int, required=True, help="минимальная частота, МГц")
+    parser.add_argument("--max-freq", type=int, required=True, help="максимальная частота, МГц")
+    parser.add_argument("--min-power", type=float, required=True, help="минимальная мощность, дБ")
+    parser.add_argument("--actions", default="2,4", help="номера действий через запятую: 1 — показ, 2 — .data, 3 — KML, 4 — HTML, 6 — таблица, 5 — всё")
+    parser.add_argument("--output-dir", default=".", help="папка для результатов")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    parser.add_argument("--map-mode", choices=MAP_MODES, default=None, help="режим карты HTML (по умолчанию 'auto')")
+    parser.add_argument("--poll", type=float, default=LIVE_POLL_SEC, help="пауза между проверками файлов, с")
+    parser.add_argument("--map-refresh", type=float, default=LIVE_MAP_REFRESH_SEC, help="период обновления карты, с")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="завершить после стольких секунд без новых строк")
+    add_kml_arguments(parser)
+    args = parser.parse_args()
+    if args.min_freq > args.max_freq:
+        parser.error("Максимальная частота должна быть не меньше минимальной.")
+    follow(args.log_file, args.data_file, args.min_freq, args.max_freq, args.min_power,
+           args.actions.replace(',', ' ').split(), args.output_dir, args.interpolate, args.map_mode,
+           args.poll, args.map_refresh, args.idle_timeout, kml_options_from_args(args))
@@ -0,0 +1,173 @@
+# Построение карты 2D с отобранными точками в нескольких режимах.
+# При большом числе точек маркер на каждую точку делает HTML огромным,
+# поэтому есть тепловая карта, сетка со сводкой по ячейкам и быстрый кластер из массива.
+import math  # Для перевода метров в градусы
+import logging  # Для записи логов
+
+import numpy as np  # Для сводки по ячейкам сетки
+import folium  # Для создания 2D-карты
+from folium.plugins import MarkerCluster, FastMarkerCluster, HeatMap  # Слои точек
+from branca.colormap import LinearColormap  # Шкала цвета по мощности
+
+from gps_metrics import stage, count  # Замеры по этапам
+
+# БЛОК 1: Настройки карты
+MAP_MODES = ('auto', 'markers', 'fast', 'heatmap', 'grid')
+MAP_MODE = 'auto'  # Режим по умолчанию
+MAP_AUTO_MAX_MARKERS = 5000  # В режиме 'auto' больше этого числа точек показывается сводкой
+MAP_AUTO_AGGREGATED_MODE = 'grid'  # Во что переключается режим 'auto' на больших данных
+GRID_CELL_METERS = 100.0  # Размер ячейки сетки, м
+METERS_PER_DEGREE = 111320.0  # Метров в градусе широты
+
+# Быстрый кластер: точка приходит как [широта, долгота, высота, мин. частота, макс. частота, макс. мощность, время]
+FAST_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindTooltip('Высота: ' + row[2].toFixed(2) + ' м<br>Время: ' + row[6] +
+        '<br>Частоты: ' + row[3] + ' - ' + row[4] + ' МГц<br>Макс. мощность: ' + row[5] + ' дБ');
+    return marker;
+}
+"""
+
+
+# БЛОК 2: Основа карты
+def _base_map(filtered_data_points):
+    map_center = filtered_data_points[0]['coords'][:2] if filtered_data_points else [0, 0]
+    m = folium.Map(location=map_center, zoom_start=12, tiles=None)  # Пустая карта
+    folium.TileLayer(  # Добавляем слой карты
+        'https://tiles.stadiamaps.com/tiles/alidade_smooth/{z}/{x}/{y}{r}.png',
+        attr='© <a href="https://stadiamaps.com/">Stadia Maps</a> © <a href="https://openmaptiles.org/">OpenMapTiles</a> © <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
+        name='Stadia Maps Alidade Smooth',
+        control=True
+    ).add_to(m)
+    return m
+
+
+# Широта, долгота и максимальная мощность каждой точки
+def _point_arrays(filtered_data_points):
+    lat = np.array([data['coords'][0] for data in filtered_data_points], dtype=np.float64)
+    lon = np.array([data['coords'][1] for data in filtered_data_points], dtype=np.float64)
+    max_power = np.array([max(data['powers']) for data in filtered_data_points], dtype=np.float64)
+    return lat, lon, max_power
+
+
+# БЛОК 3: Слои
+# Маркер с подробной подсказкой на каждую точку
+def add_markers(m, filtered_data_points, min_frequency, max_frequency, min_power_db):
+    marker_cluster = MarkerCluster().add_to(m)  # Группировка точек
+    for i, data in enumerate(filtered_data_points):
+        lat, lon, alt = data['coords']
+        tooltip_text = f"Точка {i + 1}<br>"
+        tooltip_text += f"Параметры отбора:<br>Мин. частота: {min_frequency} МГц<br>Макс. частота: {max_frequency} МГц<br>Мин. мощность: {min_power_db} дБ<br><br>"
+        tooltip_text += f"Координаты: Широта {lat:.6f}, Долгота {lon:.6f}, Высота {alt:.2f} м<br>"
+        tooltip_text += f"Время: {data['timestamp'].strftime('%H:%M:%S')}<br>"
+        tooltip_text += f"Частоты: {data['freq_min']} - {data['freq_max']} МГц<br>"
+        tooltip_text += f"Мощности: {', '.join(map(str, data['powers']))} дБ"
+        folium.Marker((lat, lon), tooltip=tooltip_text).add_to(marker_cluster)
+
+
+# Кластер, который получает точки одним массивом и создаёт маркеры уже в браузере
+def add_fast_markers(m, filtered_data_points):
+    rows = [[round(data['coords'][0], 6), round(data['coords'][1], 6), round(data['coords'][2], 2),
+             data['freq_min'], data['freq_max'], max(data['powers']), data['timestamp'].strftime('%H:%M:%S')]
+            for data in filtered_data_points]
+    FastMarkerCluster(rows, callback=FAST_MARKER_CALLBACK, name='Точки').add_to(m)
+
+
+# Тепловая карта: вес точки — её максимальная мощность, приведённая к 0..1
+def add_heatmap(m, filtered_data_points):
+    if not filtered_data_points:
+        return
+    lat, lon, max_power = _point_arrays(filtered_data_points)
+    span = max_power.max() - max_power.min()
+    weight = (max_power - max_power.min()) / span if span > 0 else np.ones_like(max_power)
+    HeatMap(np.column_stack((lat, lon, weight)).round(6).tolist(), name='Мощность сигнала').add_to(m)
+
+
+# Сводка по квадратным ячейкам: число точек, максимум и среднее максимальной мощности, частоты
+def aggregate_grid(filtered_data_points, cell_meters=GRID_CELL_METERS):
+    lat, lon, max_power = _point_arrays(filtered_data_points)
+    freq_min = np.array([data['freq_min'] for data in filtered_data_points], dtype=np.int64)
+    freq_max = np.array([data['freq_max'] for data in filtered_data_points], dtype=np.int64)
+    lat0 = float(lat.min())
+    lon0 = float(lon.min())
+    cell_lat = cell_meters / METERS_PER_DEGREE
+    cell_lon = cell_meters / (METERS_PER_DEGREE * max(math.cos(math.radians(lat0)), 1e-6))
+    cells = np.column_stack((np.floor((lat - lat0) / cell_lat), np.floor((lon - lon0) / cell_lon))).astype(np.int64)
+    keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    count = np.bincount(inverse, minlength=len(keys))
+    power_max = np.full(len(keys), -np.inf)
+    np.maximum.at(power_max, inverse, max_power)
+    power_mean = np.bincount(inverse, weights=max_power, minlength=len(keys)) / count
+    band_min = np.full(len(keys), np.iinfo(np.int64).max)
+    np.minimum.at(band_min, inverse, freq_min)
+    band_max = np.full(len(keys), np.iinfo(np.int64).min)
+    np.maximum.at(band_max, inverse, freq_max)
+    south = lat0 + keys[:, 0] * cell_lat
+    west = lon0 + keys[:, 1] * cell_lon
+    return [{"bounds": [[s, w], [s + cell_lat, w + cell_lon]], "count": int(c), "power_max": float(pmax),
+             "power_mean": float(pmean), "freq_min": int(fmin), "freq_max": int(fmax)}
+            for s, w, c, pmax, pmean, fmin, fmax in zip(south, west, count, power_max, power_mean, band_min, band_max)]
+
+
+def add_grid(m, filtered_data_points, cell_meters=GRID_CELL_METERS):
+    if not filtered_data_points:
+        return
+    cells = aggregate_grid(filtered_data_points, cell_meters)
+    vmin = min(cell['power_max'] for cell in cells)
+    vmax = max(cell['power_max'] for cell in cells)
+    colormap = LinearColormap(['blue', 'yellow', 'red'], vmin=vmin, vmax=max(vmax, vmin + 1e-9),
+                              caption='Макс. мощность в ячейке, дБ')
+    layer = folium.FeatureGroup(name=f'Сетка {cell_meters:g} м')
+    for cell in cells:
+        folium.Rectangle(
+            cell['bounds'], color=None, weight=0, fill=True, fill_opacity=0.6,
+            fill_color=colormap(cell['power_max']),
+            tooltip=(f"Точек: {cell['count']}<br>Макс. мощность: {cell['power_max']:.1f} дБ<br>"
+                     f"Средняя макс. мощность: {cell['power_mean']:.1f} дБ<br>"
+                     f"Частоты: {cell['freq_min']} - {cell['freq_max']} МГц")
+        ).add_to(layer)
+    layer.add_to(m)
+    colormap.add_to(m)
+
+
+# Трек полёта одной линией; track — точки (широта, долгота, высота)
+def add_track(m, track):
+    layer = folium.FeatureGroup(name='Трек полёта')
+    folium.PolyLine([(round(lat, 7), round(lon, 7)) for lat, lon, _ in track], color='#3366cc', weight=2,
+                    opacity=0.8, tooltip='Трек полёта').add_to(layer)
+    layer.add_to(m)
+
+
+# БЛОК 4: Создание карты
+def resolve_map_mode(mode, point_count):
+    if mode == 'auto':
+        return 'markers' if point_count <= MAP_AUTO_MAX_MARKERS else MAP_AUTO_AGGREGATED_MODE
+    return mode
+
+
+# Создание карты 2D с отобранными точками и, если передан, треком полёта
+def build_map(filtered_data_points, min_frequency, max_frequency, min_power_db, mode=None, track=None):
+    logging.info("Создание карты 2D...")
+    print("Создание карты 2D...")
+    mode = resolve_map_mode(mode or MAP_MODE, len(filtered_data_points))
+    if mode not in MAP_MODES:
+        raise ValueError(f"Неизвестный режим карты: '{mode}'. Возможные: {', '.join(MAP_MODES)}.")
+    with stage("map"):
+        count("points", len(filtered_data_points))
+        m = _base_map(filtered_data_points)
+        logging.info(f"Добавление точек на карту (режим '{mode}')...")
+        print("Добавление точек на карту...")
+        if mode == 'markers':
+            add_markers(m, filtered_data_points, min_frequency, max_frequency, min_power_db)
+        elif mode == 'fast':
+            add_fast_markers(m, filtered_data_points)
+        elif mode == 'heatmap':
+            add_heatmap(m, filtered_data_points)
+        elif mode == 'grid':
+            add_grid(m, filtered_data_points)
+        if track:
+            add_track(m, track)
+            count("track_points", len(track))
+    return m
@@ -0,0 +1,77 @@
+# Сопоставление измерений с точками GPS по времени
+# Точки GPS один раз сортируются по времени (в секундах), а измерения находятся двоичным поиском
+# сразу для всего массива. Правило одно для всех режимов (сессия, потоковый, параллельный, живой):
+# ближайшая точка (при равной разнице — более ранняя), допуск MATCH_TOLERANCE_SEC, интерполяция между соседями.
+import numpy as np  # Для двоичного поиска по массивам
+
+# БЛОК 1: Настройки сопоставления
+MATCH_TOLERANCE_SEC = 1.0  # Максимальная разница во времени между измерением и точкой GPS
+
+
+# БЛОК 2: Сопоставление по времени для всех измерений сразу
+# Возвращает индекс ближайшей точки GPS (-1, если нет точки в пределах допуска) и координаты
+def match_times(gps_times, gps_coords, targets, tolerance=MATCH_TOLERANCE_SEC, interpolate=False):
+    n = len(gps_times)
+    idx = np.full(len(targets), -1, dtype=np.int64)
+    coords = np.full((len(targets), 3), np.nan)
+    if n == 0 or len(targets) == 0:
+        return idx, coords
+    j = np.searchsorted(gps_times, targets, side='left')
+    left = np.clip(j - 1, 0, n - 1)
+    right = np.clip(j, 0, n - 1)
+    use_left = (j >= n) | ((j > 0) & (targets - gps_times[left] <= gps_times[right] - targets))
+    nearest = np.where(use_left, left, right)
+    nearest = np.searchsorted(gps_times, gps_times[nearest], side='left')  # Первая из одинаковых по времени
+    ok = np.abs(gps_times[nearest] - targets) <= tolerance
+    idx[ok] = nearest[ok]
+    coords[ok] = gps_coords[nearest[ok]]
+    if interpolate:
+        inside = ok & (j > 0) & (j < n)
+        t0 = gps_times[left[inside]]
+        t1 = gps_times[right[inside]]
+        span = t1 - t0
+        k = np.divide(targets[inside] - t0, span, out=np.zeros_like(span), where=span > 0)
+        c0 = gps_coords[left[inside]]
+        c1 = gps_coords[right[inside]]
+        interpolated = c0 + (c1 - c0) * k[:, None]
+        interpolated[span <= 0] = coords[inside][span <= 0]  # Одинаковое время — берём ближайшую
+        coords[inside] = interpolated
+    return idx, coords
+
+
+# БЛОК 3: Индекс времени точек GPS
+class GpsTimeIndex:
+    def __init__(self, times, coords):
+        # times — время точек в секундах, coords — кортежи (широта, долгота, высота)
+        if len(times) != len(coords):
+            raise ValueError("Количество времён и координат GPS не совпадает.")
+        times = np.asarray(times, dtype=np.float64)
+        order = np.argsort(times, kind='stable')  # Устойчивая сортировка
+        self.times = times[order]
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)[order]
+
+    @classmethod
+    def from_fixes(cls, times_us, coords):
+        # Время в микросекундах из журнала переводим в секунды от первой точки файла
+        if not len(times_us):
+            return cls([], [])
+        times_us = np.asarray(times_us, dtype=np.int64)
+        return cls((times_us - times_us[0]) / 1_000_000, coords)
+
+    def __len__(self):
+        return len(self.times)
+
+    def nearest(self, target_sec):
+        if not len(self.times):
+            return None
+        return int(match_times(self.times, self.coords, np.array([target_sec]), np.inf)[0][0])
+
+    # Индексы и координаты для массива моментов (секунды); -1 и NaN — нет точки в пределах допуска
+    def match_many(self, targets, tolerance=MATCH_TOLERANCE_SEC, interpolate=False):
+        return match_times(self.times, self.coords, np.asarray(targets, dtype=np.float64), tolerance, interpolate)
+
+    def match(self, target_sec, tolerance=MATCH_TOLERANCE_SEC, interpolate=False):
+        idx, coords = self.match_many([target_sec], tolerance, interpolate)
+        if idx[0] < 0:
+            return None  # Нет точки GPS в пределах допуска
+        return tuple(coords[0].tolist())
@@ -0,0 +1,238 @@
+# Замеры по этапам обработки: время (общее и процессорное), счётчики строк и точек, память этапа.
+# Память по умолчанию — на сколько этап поднял пик памяти процесса (ru_maxrss), это почти ничего не стоит.
+# Точный пик этапа (наибольший объём выделенной Python и NumPy памяти) даёт tracemalloc, но он заметно
+# замедляет работу и искажает время этапов, поэтому включается только отдельным флагом.
+# Этапы отмечаются в коде блоком "with stage('имя'):", счётчики — вызовом count().
+# Сводка печатается таблицей и пишется в JSON, нужные этапы можно запустить под cProfile.
+# Включается флагами терминальных скриптов или переменными окружения, без правки кода:
+#   GPS_METRICS=1                  — печатать сводку в конце работы
+#   GPS_METRICS_JSON=путь.json     — записать сводку в JSON
+#   GPS_METRICS_MEMORY=1           — пик памяти каждого этапа через tracemalloc (медленнее)
+#   GPS_PROFILE=match,filter       — этапы под cProfile ('all' — все этапы)
+#   GPS_PROFILE_DIR=папка          — куда сохранять файлы .prof
+import io  # Для текста профиля
+import os  # Для переменных окружения и путей
+import sys  # Для определения системы
+import json  # Для файла сводки
+import time  # Для замера времени
+import atexit  # Для сводки в конце работы
+import logging  # Для записи логов
+import cProfile  # Для профиля этапа
+import pstats  # Для вывода профиля
+import tracemalloc  # Для пика памяти этапа
+from contextlib import contextmanager  # Для блока "with stage(...)"
+
+try:
+    import resource  # Для пика памяти (есть не во всех системах)
+except ImportError:
+    resource = None
+
+# БЛОК 1: Настройки
+PROFILE_TOP_LINES = 15  # Сколько строк профиля выводить
+METRICS_STAGE_NAMES = {  # Понятные названия этапов для таблицы
+    "cache_load": "Чтение кэша",
+    "gps_read": "Чтение GPS",
+    "first_valid_scan": "Поиск первого времени",
+    "data_parse": "Разбор данных",
+    "track_simplify": "Упрощение трека",
+    "match": "Сопоставление",
+    "stream": "Потоковая обработка",
+    "parallel_chunks": "Куски на всех ядрах",
+    "segment_merge": "Склейка частей",
+    "filter": "Отбор",
+    "map": "Карта",
+    "save_1": "Показ точек",
+    "save_2": "Сохранение .data",
+    "save_3": "Сохранение KML",
+    "save_4": "Сохранение HTML",
+    "save_6": "Сохранение таблицы",
+    "columnar_export": "Выгрузка таблицы",
+}
+
+
+# Пик занятой процессом памяти за всё время работы, МБ (на Linux ru_maxrss в КБ, на macOS — в байтах)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# БЛОК 2: Сбор замеров
+class MetricsRecorder:
+    def __init__(self):
+        self.stages = []  # Завершённые этапы по порядку начала
+        self.enabled = False
+        self.memory = False  # Пик памяти этапов через tracemalloc
+        self.json_path = None
+        self.profile_stages = set()
+        self.profile_dir = None
+        self._active = []  # Открытые этапы (вложенные — в конце)
+        self._profiling = False
+        self._registered = False
+
+    def configure(self, enabled=True, json_path=None, profile_stages=(), profile_dir=None, memory=False):
+        self.json_path = json_path
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        if enabled or json_path or profile_stages or memory:
+            self.enable(memory)
+            if not self._registered:
+                atexit.register(self.report)
+                self._registered = True
+
+    # Запись этапов без сводки в конце работы (сводку выводит вызывающий код)
+    def enable(self, memory=False):
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        self.stages = []
+
+    def _wants_profile(self, name):
+        return not self._profiling and ('all' in self.profile_stages or name in self.profile_stages)
+
+    # Пик tracemalloc с прошлого сброса достаётся всем открытым этапам, затем пик сбрасывается:
+    # так у вложенного этапа свой пик, а у внешнего — наибольший из своего и вложенных
+    def _take_peak(self):
+        if not self.memory or not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        for record in self._active:
+            record["peak_mb"] = max(record["peak_mb"] or 0.0, peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield None  # Замеры выключены — этап не записывается
+            return
+        record = {"stage": name, "depth": len(self._active), "wall_sec": 0.0, "cpu_sec": 0.0,
+                  "rss_growth_mb": None, "peak_mb": None, "counts": {}}
+        self.stages.append(record)
+        rss_started = peak_rss_mb()
+        self._take_peak()
+        self._active.append(record)
+        profiler = None
+        if self._wants_profile(name):
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_sec"] = time.perf_counter() - wall_started
+            record["cpu_sec"] = time.process_time() - cpu_started
+            if rss_started is not None:
+                record["rss_growth_mb"] = peak_rss_mb() - rss_started
+            self._take_peak()
+            self._active.pop()
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                self._save_profile(name, profiler)
+
+    # Прибавить к счётчику текущего этапа (вне этапов ничего не делает)
+    def count(self, key, value=1):
+        if self._active:
+            counts = self._active[-1]["counts"]
+            counts[key] = counts.get(key, 0) + value
+
+    # Этапы из другого процесса (например, одного полёта в пакетной обработке)
+    def extend(self, stages, prefix=None):
+        for record in stages:
+            record = dict(record, depth=record["depth"] + len(self._active))
+            if prefix:
+                record["stage"] = f"{prefix}/{record['stage']}"
+            self.stages.append(record)
+
+    def _save_profile(self, name, profiler):
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(PROFILE_TOP_LINES)
+        logging.info(f"Профиль этапа '{name}':\n{text.getvalue()}")
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            number = sum(1 for record in self.stages if record["stage"] == name)
+            path = os.path.join(self.profile_dir, f"{name}_{number}.prof")
+            profiler.dump_stats(path)
+            logging.info(f"Профиль этапа '{name}' сохранён в файл: {path}")
+
+    # БЛОК 3: Сводка
+    def summary_table(self):
+        header = f"{'Этап':<32} {'Время, с':>9} {'ЦП, с':>9} {'Рост пика, МБ':>14} {'Пик этапа, МБ':>14}  Счётчики"
+        lines = [header, "-" * len(header)]
+        for record in self.stages:
+            name = record["stage"].rsplit('/', 1)
+            title = METRICS_STAGE_NAMES.get(name[-1], name[-1])
+            if len(name) > 1:
+                title = f"{name[0]}/{title}"
+            title = ("  " * record["depth"] + title)[:32]
+            growth = f"{record['rss_growth_mb']:.1f}" if record.get("rss_growth_mb") is not None else "-"
+            peak = f"{record['peak_mb']:.1f}" if record.get("peak_mb") is not None else "-"
+            counts = ", ".join(f"{key}={value}" for key, value in record["counts"].items())
+            lines.append(f"{title:<32} {record['wall_sec']:>9.3f} {record['cpu_sec']:>9.3f} {growth:>14} {peak:>14}  {counts}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {"stages": self.stages}
+
+    def save_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        logging.info(f"Замеры этапов сохранены в файл: {path}")
+
+    # Вывод в конце работы: таблица и JSON, если они включены
+    def report(self):
+        if not self.enabled or not self.stages:
+            return
+        print("\n--- Замеры по этапам ---")
+        print(self.summary_table())
+        if self.json_path:
+            self.save_json(self.json_path)
+            print(f"Замеры этапов сохранены в файл: {self.json_path}")
+
+
+# БЛОК 4: Общий сборщик и его настройка
+recorder = MetricsRecorder()
+
+
+def stage(name):
+    return recorder.stage(name)
+
+
+def count(key, value=1):
+    recorder.count(key, value)
+
+
+def _split_stages(text):
+    return [name for name in (text or "").replace(',', ' ').split() if name]
+
+
+def configure_from_env():
+    profile_stages = _split_stages(os.environ.get("GPS_PROFILE"))
+    memory = bool(os.environ.get("GPS_METRICS_MEMORY"))
+    if os.environ.get("GPS_METRICS") or os.environ.get("GPS_METRICS_JSON") or profile_stages or memory:
+        recorder.configure(True, os.environ.get("GPS_METRICS_JSON"), profile_stages,
+                           os.environ.get("GPS_PROFILE_DIR"), memory)
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics", action="store_true", help="напечатать в конце замеры по этапам")
+    parser.add_argument("--metrics-json", default=None, help="записать замеры по этапам в файл JSON")
+    parser.add_argument("--metrics-memory", action="store_true",
+                        help="пик памяти каждого этапа через tracemalloc (заметно медленнее, время этапов искажается)")
+    parser.add_argument("--profile", default=None, help="этапы под cProfile через запятую ('all' — все)")
+    parser.add_argument("--profile-dir", default=None, help="папка для файлов профиля .prof")
+
+
+def configure_from_args(args):
+    if args.metrics or args.metrics_json or args.profile or args.metrics_memory:
+        recorder.configure(True, args.metrics_json, _split_stages(args.profile), args.profile_dir,
+                           args.metrics_memory)
+
+
+configure_from_env()
@@ -0,0 +1,187 @@
+# Параллельная обработка одного большого файла .data.
+# Файл делится по границам строк на куски байтов; процессы разбирают и отбирают свои куски
+# по общему индексу GPS (только для чтения), а результаты склеиваются в исходном порядке.
+# Результат совпадает с последовательной обработкой, включая поиск первого правильного времени.
+import os  # Для размеров файлов и числа ядер
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+from concurrent.futures import ProcessPoolExecutor  # Для работы на всех ядрах
+
+import numpy as np  # Для масок и склейки результатов
+
+from gps_matcher import MATCH_TOLERANCE_SEC  # Допуск по времени для сопоставления
+from gps_session import (DATA_BLOCK_LINES, read_gps_log, prepare_gps, find_first_valid_time, parse_data_block,
+                         log_data_warning, match_times, filter_rows, build_filtered_output)
+from gps_map import MAP_MODES  # Режимы карты 2D
+from gps_kml import add_kml_arguments, kml_options_from_args  # Настройки записи KML/KMZ
+from gps_metrics import stage, count, add_metrics_arguments, configure_from_args  # Замеры по этапам
+from gps_data_visualization import perform_save  # Сохранение результатов
+
+# БЛОК 1: Настройки
+MIN_CHUNK_BYTES = 4 * 1024 * 1024  # Меньше этого файл на куски не делится
+CHUNKS_PER_WORKER = 4  # Кусков на процесс — чтобы ядра не простаивали на неравных кусках
+DATA_ENCODING = 'utf-8'  # Кодировка файла данных
+
+_worker_gps = {}  # Индекс GPS в процессе-обработчике, задаётся один раз при запуске процесса
+
+
+def _init_worker(gps_time, gps_coords, interpolate):
+    _worker_gps.update(time=gps_time, coords=gps_coords, interpolate=interpolate)
+
+
+# БЛОК 2: Деление файла на куски
+# Номер, время и смещение в байтах первой строки с временем больше нуля
+def find_first_valid_offset(data_file):
+    offsets = [0, 0]  # Начало текущей строки и начало следующей
+
+    def decoded_lines(f):
+        for raw in f:
+            offsets[0] = offsets[1]
+            offsets[1] += len(raw)
+            yield raw.decode(DATA_ENCODING)
+
+    with open(data_file, 'rb') as f:
+        lines = decoded_lines(f)
+        first_valid_index, first_valid_time, _ = find_first_valid_time(lines)
+        lines.close()
+    return first_valid_index, first_valid_time, offsets[0]
+
+
+# Куски [начало, конец) от смещения start до конца файла; границы всегда на началах строк
+def split_chunks(data_file, start, workers):
+    size = os.path.getsize(data_file)
+    count = max(1, min(workers * CHUNKS_PER_WORKER, (size - start) // MIN_CHUNK_BYTES))
+    bounds = [start]
+    with open(data_file, 'rb') as f:
+        for k in range(1, count):
+            target = start + (size - start) * k // count
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()  # Дочитываем строку, в которую попала граница
+            position = f.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Строки куска: переводы строк как при чтении файла в текстовом режиме
+def _read_chunk_lines(data_file, start, end):
+    with open(data_file, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(DATA_ENCODING)
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()  # После последнего перевода строки строки нет
+    return lines
+
+
+# БЛОК 3: Обработка куска (выполняется в процессе из пула)
+# Ошибки в строках не пишутся в лог сразу: номера строк известны только после склейки
+def process_chunk(data_file, start, end, first_valid_time, min_frequency, max_frequency, min_power_db):
+    lines = _read_chunk_lines(data_file, start, end)
+    warnings = []
+    parts = []
+    for offset in range(0, len(lines), DATA_BLOCK_LINES):
+        block = parse_data_block(lines[offset:offset + DATA_BLOCK_LINES], offset + 1,
+                                 warn=lambda kind, index, text: warnings.append((kind, index, text)))
+        times, freq_min, freq_max, powers = block
+        relative_times = times - first_valid_time
+        match_idx, match_coords = match_times(_worker_gps['time'], _worker_gps['coords'],
+                                              np.round(relative_times, 6), MATCH_TOLERANCE_SEC,
+                                              _worker_gps['interpolate'])
+        mask, above = filter_rows(match_idx >= 0, freq_min, freq_max, powers,
+                                  min_frequency, max_frequency, min_power_db)
+        rows = np.flatnonzero(mask)
+        parts.append((relative_times[rows], freq_min[rows], freq_max[rows], match_coords[rows],
+                      powers[rows], above[rows]))
+    return {"lines": len(lines), "warnings": warnings, "parts": parts}
+
+
+# БЛОК 4: Параллельный отбор
+# Возвращает точки и строки в том же виде, что и FlightSession.filter, или None при ошибке
+def filter_parallel(log_file, data_file, min_frequency, max_frequency, min_power_db, workers=None,
+                    interpolate=False):
+    if not os.path.exists(log_file):
+        logging.error(f"Файл журнала '{log_file}' не найден.")
+        print(f"Ошибка: Файл журнала '{log_file}' не найден.")
+        return None
+    logging.info("Чтение точек GPS из файла журнала...")
+    print("Чтение точек GPS из файла журнала...")
+    with stage("gps_read"):
+        gps_times_us, gps_coords = read_gps_log(log_file)
+    if not gps_coords:
+        logging.warning("Нет данных GPS для карты.")
+        print("Нет данных GPS для карты.")
+        return None
+    logging.info(f"Прочитано {len(gps_coords)} точек GPS.")
+    if not os.path.isfile(data_file):
+        logging.error(f"Файл данных '{data_file}' не найден.")
+        print(f"Файл данных '{data_file}' не найден.")
+        return None
+    first_gps_time, gps_time, gps_coords_sorted = prepare_gps(gps_times_us, gps_coords)
+    logging.info("Поиск первого правильного времени в файле данных...")
+    print("Поиск первого правильного времени в файле данных...")
+    with stage("first_valid_scan"):
+        first_valid_index, first_valid_time, start = find_first_valid_offset(data_file)
+    if first_valid_index is None:
+        logging.error("Нет правильного времени в файле данных.")
+        print("Нет правильного времени в файле данных.")
+        return None
+    workers = workers or os.cpu_count() or 1
+    chunks = split_chunks(data_file, start, workers)
+    logging.info(f"Параллельный отбор: {len(chunks)} кусков, процессов: {workers}.")
+    print(f"Параллельный отбор: {len(chunks)} кусков, процессов: {workers}.")
+    with stage("parallel_chunks"), ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                       initargs=(gps_time, gps_coords_sorted, interpolate)) as pool:
+        futures = [pool.submit(process_chunk, data_file, chunk_start, chunk_end, first_valid_time,
+                               min_frequency, max_frequency, min_power_db)
+                   for chunk_start, chunk_end in chunks]
+        filtered_data_points = []
+        filtered_lines = []
+        line_number = first_valid_index  # Номер строки перед началом текущего куска
+        for future in futures:  # По порядку кусков
+            result = future.result()
+            for kind, index, text in result["warnings"]:
+                log_data_warning(kind, line_number + index, text)
+            for part in result["parts"]:
+                points, lines = build_filtered_output(first_gps_time, *part)
+                filtered_data_points.extend(points)
+                filtered_lines.extend(lines)
+            line_number += result["lines"]
+            count("lines_read", result["lines"])
+            count("lines_rejected", len(result["warnings"]))
+        count("points", len(filtered_data_points))
+    logging.info(f"Найдено {len(filtered_data_points)} точек по параметрам отбора.")
+    print(f"Найдено {len(filtered_data_points)} точек по параметрам отбора.")
+    return filtered_data_points, filtered_lines
+
+
+# БЛОК 5: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Параллельный отбор одного большого файла .data по журналу GPS.")
+    parser.add_argument("log_file", help="файл журнала GPS (.log)")
+    parser.add_argument("data_file", help="файл данных (.data)")
+    parser.add_argument("--min-freq", type=int, required=True, help="минимальная частота, МГц")
+    parser.add_argument("--max-freq", type=int, required=True, help="максимальная частота, МГц")
+    parser.add_argument("--min-power", type=float, required=True, help="минимальная мощность, дБ")
+    parser.add_argument("--actions", default="2,3", help="номера действий через запятую: 1 — показ, 2 — .data, 3 — KML, 4 — HTML, 6 — таблица")
+    parser.add_argument("--output-dir", default=".", help="папка для результатов")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — число ядер)")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    parser.add_argument("--map-mode", choices=MAP_MODES, default=None, help="режим карты HTML (по умолчанию 'auto')")
+    add_kml_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.min_freq > args.max_freq:
+        parser.error("Максимальная частота должна быть не меньше минимальной.")
+    configure_from_args(args)
+    result = filter_parallel(args.log_file, args.data_file, args.min_freq, args.max_freq, args.min_power,
+                             args.workers, args.interpolate)
+    if result is not None:
+        chosen = args.actions.replace(',', ' ').split()
+        filtered_data_points, filtered_lines = result
+        os.makedirs(args.output_dir, exist_ok=True)
+        perform_save(filtered_data_points, filtered_lines, None, args.min_freq, args.max_freq, args.min_power,
+                     chosen, output_dir=args.output_dir, kml_options=kml_options_from_args(args), map_mode=args.map_mode)
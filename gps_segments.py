@@ -0,0 +1,223 @@
+# Один полёт из нескольких частей: самописец начинает новые файлы .log и .data по ходу полёта.
+# Время точек GPS переводится в общее время GPS по полям GWk (неделя) и GMS (мс от начала недели),
+# части склеиваются слиянием уже упорядоченных по времени потоков (k-way merge) в один индекс,
+# поэтому измерение в конце одной части находит точку GPS из начала следующей. Файлы на диске не склеиваются.
+import os  # Для папки результатов
+import heapq  # Для слияния упорядоченных потоков
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+from datetime import datetime, timedelta  # Для начала отсчёта GPS
+from itertools import repeat  # Для номера части в потоке слияния
+
+import numpy as np  # Для столбцов
+
+from gps_session import (GPS_BASE_DATE, FlightSession, parse_gps_line, read_data_file,
+                         concat_blocks)  # Разбор строк и сессия полёта
+from gps_metrics import stage, count, add_metrics_arguments, configure_from_args  # Замеры по этапам
+
+# БЛОК 1: Настройки
+GPS_EPOCH = datetime(1980, 1, 6)  # Начало отсчёта времени GPS (неделя 0)
+SECONDS_PER_WEEK = 604800
+GPS_CLOCK_JUMP_SEC = 1.0  # Сдвиг часов TimeUS между частями больше этого — самописец перезапускался
+GPS_LEAP_SECONDS = (  # Разница GPS − UTC, с: дата введения и значение
+    (datetime(1981, 7, 1), 1), (datetime(1982, 7, 1), 2), (datetime(1983, 7, 1), 3),
+    (datetime(1985, 7, 1), 4), (datetime(1988, 1, 1), 5), (datetime(1990, 1, 1), 6),
+    (datetime(1991, 1, 1), 7), (datetime(1992, 7, 1), 8), (datetime(1993, 7, 1), 9),
+    (datetime(1994, 7, 1), 10), (datetime(1996, 1, 1), 11), (datetime(1997, 7, 1), 12),
+    (datetime(1999, 1, 1), 13), (datetime(2006, 1, 1), 14), (datetime(2009, 1, 1), 15),
+    (datetime(2012, 7, 1), 16), (datetime(2015, 7, 1), 17), (datetime(2017, 1, 1), 18),
+)
+
+
+# БЛОК 2: Время GPS
+# Секунды координации на момент времени GPS
+def leap_seconds(gps_time):
+    for since, seconds in reversed(GPS_LEAP_SECONDS):
+        if gps_time >= since:
+            return seconds
+    return 0
+
+
+# Время GPS строки журнала в мкс от начала отсчёта GPS или None, если неделя ещё не известна
+def parse_gps_week_us(line):
+    parts = line.split(',')
+    try:
+        gms = int(parts[4])
+        gwk = int(parts[5])
+    except (ValueError, IndexError):
+        return None
+    if gwk <= 0:
+        return None
+    return gwk * SECONDS_PER_WEEK * 1_000_000 + gms * 1000
+
+
+# Точки GPS одной части: время TimeUS (мкс), координаты и сдвиг часов TimeUS до времени GPS
+# (медиана по точкам с известной неделей; None, если недели нет ни в одной точке)
+def read_gps_segment(log_file):
+    times_us = []
+    coords = []
+    offsets = []
+    lines_read = 0
+    with open(log_file, 'r') as file:
+        for line in file:
+            lines_read += 1
+            fix = parse_gps_line(line)
+            if fix is None:
+                continue
+            times_us.append(fix[0])
+            coords.append(fix[1])
+            week_us = parse_gps_week_us(line)
+            if week_us is not None:
+                offsets.append(week_us - fix[0])
+    count("lines_read", lines_read)
+    count("fixes", len(coords))
+    times_us = np.asarray(times_us, dtype=np.int64)
+    order = np.argsort(times_us, kind='stable')  # Поток для слияния должен идти по времени
+    offset_us = int(np.median(offsets)) if offsets else None
+    return times_us[order], np.asarray(coords, dtype=np.float64).reshape(-1, 3)[order], offset_us
+
+
+# БЛОК 3: Слияние частей
+# Порядок строк склеенных массивов keys по времени. Каждый массив уже идёт по времени; если части
+# не перекрываются, слияние сводится к склейке, иначе потоки сливаются через heapq.merge
+def merge_order(keys):
+    starts = np.concatenate(([0], np.cumsum([len(key) for key in keys])))
+    filled = [number for number, key in enumerate(keys) if len(key)]
+    if all(keys[a].max() <= keys[b].min() for a, b in zip(filled, filled[1:])):
+        return np.arange(starts[-1])
+    merged = heapq.merge(*(zip(key.tolist(), repeat(number), range(len(key))) for number, key in enumerate(keys)))
+    return np.fromiter((starts[number] + row for _, number, row in merged), dtype=np.int64, count=starts[-1])
+
+
+# Сдвиги часов частей: без недели в части берётся сдвиг соседней; если недели нет нигде — None
+def fill_offsets(segments):
+    known = [segment["offset_us"] for segment in segments if segment["offset_us"] is not None]
+    if not known:
+        return None
+    previous = known[0]
+    for segment in segments:
+        if segment["offset_us"] is None:
+            logging.warning(f"В журнале '{segment['log_file']}' нет недели GPS, время берётся по соседней части.")
+            segment["offset_us"] = previous
+        previous = segment["offset_us"]
+    return segments
+
+
+# Столбцы склеенного полёта в том же виде, что у read_flight_files; время точек GPS — мкс от начала
+# отсчёта GPS, время измерений — секунды от первой точки GPS полёта
+def merge_flight_segments(pairs):
+    segments = []
+    for log_file, data_file in pairs:
+        logging.info(f"Чтение части полёта: {log_file}, {data_file}")
+        print(f"Чтение части полёта: {log_file}, {data_file}")
+        with stage("gps_read"):
+            times_us, coords, offset_us = read_gps_segment(log_file)
+        if not len(times_us):
+            logging.warning(f"Нет точек GPS в журнале '{log_file}', часть пропускается.")
+            continue
+        data = read_data_file(data_file)
+        if data is None:
+            continue
+        segments.append({"log_file": log_file, "times_us": times_us, "coords": coords, "offset_us": offset_us,
+                         "data": data})
+    if not segments:
+        logging.error("Нет частей полёта с данными GPS и измерениями.")
+        print("Нет частей полёта с данными GPS и измерениями.")
+        return None
+    with stage("segment_merge"):
+        week_time = fill_offsets(segments) is not None
+        if not week_time:
+            logging.warning("В журналах нет недели GPS: части склеиваются по TimeUS от базовой даты.")
+            for segment in segments:
+                segment["offset_us"] = 0
+        segments.sort(key=lambda segment: int(segment["times_us"][0]) + segment["offset_us"])
+        # Пока часы TimeUS идут без скачка, у всех частей один сдвиг, а время данных привязано
+        # к первой части; после перезапуска самописца привязка делается заново
+        clock_offset = None
+        for segment in segments:
+            if clock_offset is None or abs(segment["offset_us"] - clock_offset) > GPS_CLOCK_JUMP_SEC * 1_000_000:
+                if clock_offset is not None:
+                    logging.info(f"Часы самописца перезапущены перед частью '{segment['log_file']}'.")
+                clock_offset = segment["offset_us"]
+                segment["anchor"] = True
+            segment["offset_us"] = clock_offset
+        gps_keys = [segment["times_us"] + segment["offset_us"] for segment in segments]
+        gps_order = merge_order(gps_keys)
+        gps_times_us = np.concatenate(gps_keys)[gps_order]
+        gps_coords = np.concatenate([segment["coords"] for segment in segments])[gps_order]
+        first_us = int(gps_times_us[0])
+        blocks = []
+        for segment, gps_key in zip(segments, gps_keys):
+            data_times, freq_min, freq_max, powers, first_valid_time = segment["data"]
+            if segment.get("anchor"):  # Первая правильная строка данных — момент первой точки GPS части
+                shift = (int(gps_key[0]) - first_us) / 1_000_000 - first_valid_time
+            blocks.append((np.asarray(data_times, dtype=np.float64) + shift, freq_min, freq_max, powers))
+        data_order = merge_order([block[0] for block in blocks])
+        data_times, freq_min, freq_max, powers = (column[data_order] for column in concat_blocks(blocks))
+        count("segments", len(segments))
+        count("fixes", len(gps_times_us))
+        count("rows", len(data_times))
+    base_time = GPS_BASE_DATE
+    if week_time:  # Время GPS идёт без секунд координации, UTC отстаёт на них
+        base_time = GPS_EPOCH - timedelta(seconds=leap_seconds(GPS_EPOCH + timedelta(microseconds=first_us)))
+    logging.info(f"Склеено частей: {len(segments)}, точек GPS: {len(gps_times_us)}, строк данных: {len(data_times)}.")
+    return {
+        "gps_times_us": gps_times_us,
+        "gps_coords": gps_coords,
+        "data_times": data_times,
+        "freq_min": freq_min,
+        "freq_max": freq_max,
+        "powers": powers,
+        "first_valid_time": 0.0,
+        "base_time": base_time
+    }
+
+
+# Сессия по всем частям полёта; pairs — пары (файл .log, файл .data) в любом порядке
+def load_segments(pairs, interpolate=False, track_options=None):
+    columns = merge_flight_segments(pairs)
+    if columns is None:
+        return None
+    session = FlightSession.from_columns(columns, interpolate, track_options)
+    logging.info(f"Прочитано {len(session.data_time)} строк данных, "
+                 f"из них {int(session.matched.sum())} сопоставлено с GPS.")
+    return session
+
+
+# БЛОК 4: Запуск из терминала
+if __name__ == "__main__":
+    from gps_map import MAP_MODES  # Режимы карты 2D
+    from gps_kml import add_kml_arguments, kml_options_from_args  # Настройки записи KML/KMZ
+    from gps_track import add_track_arguments, track_options_from_args  # Упрощение и линия трека
+    from gps_batch import find_flight_pairs  # Поиск пар .log/.data
+    from gps_data_visualization import perform_save  # Сохранение результатов
+
+    parser = argparse.ArgumentParser(description="Отбор по полёту, записанному в нескольких парах файлов .log/.data.")
+    parser.add_argument("patterns", nargs='+', help="папки или шаблоны файлов частей полёта (пары с одинаковым именем)")
+    parser.add_argument("--min-freq", type=int, required=True, help="минимальная частота, МГц")
+    parser.add_argument("--max-freq", type=int, required=True, help="максимальная частота, МГц")
+    parser.add_argument("--min-power", type=float, required=True, help="минимальная мощность, дБ")
+    parser.add_argument("--actions", default="2,3", help="номера действий через запятую: 1 — показ, 2 — .data, 3 — KML, 4 — HTML, 6 — таблица")
+    parser.add_argument("--output-dir", default=".", help="папка для результатов")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    parser.add_argument("--map-mode", choices=MAP_MODES, default=None, help="режим карты HTML (по умолчанию 'auto')")
+    add_kml_arguments(parser)
+    add_track_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.min_freq > args.max_freq:
+        parser.error("Максимальная частота должна быть не меньше минимальной.")
+    configure_from_args(args)
+    segment_pairs = [(log_file, data_file) for _, log_file, data_file in find_flight_pairs(args.patterns)]
+    if not segment_pairs:
+        parser.error("Не найдено ни одной пары файлов .log/.data.")
+    flight = load_segments(segment_pairs, args.interpolate, track_options_from_args(args))
+    if flight is not None:
+        filtered_data_points, filtered_lines = flight.filter(args.min_freq, args.max_freq, args.min_power)
+        logging.info(f"Найдено {len(filtered_data_points)} точек по параметрам отбора.")
+        print(f"Найдено {len(filtered_data_points)} точек по параметрам отбора.")
+        os.makedirs(args.output_dir, exist_ok=True)
+        perform_save(filtered_data_points, filtered_lines, None, args.min_freq, args.max_freq, args.min_power,
+                     args.actions.replace(',', ' ').split(), output_dir=args.output_dir,
+                     kml_options=kml_options_from_args(args), map_mode=args.map_mode,
+                     track=flight.track_line() if args.draw_track else None)
@@ -0,0 +1,356 @@
+# Загруженная сессия: файлы .log и .data читаются один раз в столбцы-массивы,
+# сопоставление по времени считается сразу, а новые фильтры — это маски по массивам.
+import os  # Для проверки путей
+import logging  # Для записи логов
+from datetime import datetime, timedelta  # Для работы с датами и временем
+from itertools import chain  # Для склейки значений мощности в один список
+
+import numpy as np  # Для столбцов-массивов и масок
+
+from gps_matcher import MATCH_TOLERANCE_SEC, match_times  # Сопоставление по времени (одно правило для всех режимов)
+from gps_cache import load_cached_columns, save_cached_columns, source_cache_key  # Кэш разобранных файлов
+from gps_metrics import stage, count  # Замеры по этапам
+from gps_track import reduce_track, simplify_track, TRACK_DISPLAY_TOLERANCE_M  # Упрощение трека GPS
+
+# БЛОК 1: Настройки
+GPS_BASE_DATE = datetime(2025, 1, 28)  # Базовая дата для времени из журнала
+GPS_MIN_STATUS = 3  # Минимальный статус GPS, который берём в работу
+DATA_BLOCK_LINES = 8192  # Сколько строк данных разбирается одним блоком
+
+
+# БЛОК 2: Чтение файлов
+# Разбор одной строки журнала: время (мкс) и координаты или None, если строка не подходит
+def parse_gps_line(line):
+    if not line.startswith("GPS"):  # Только строки с GPS
+        return None
+    parts = [p.strip() for p in line.split(',')]
+    if len(parts) < 15:
+        return None
+    try:
+        status = int(parts[3])
+        if status < GPS_MIN_STATUS:  # Пропускаем плохие данные
+            return None
+        latitude = float(parts[8])
+        longitude = float(parts[9])
+        altitude = float(parts[10])
+        time_us = int(parts[1])
+    except (ValueError, IndexError):
+        logging.warning(f"Ошибка в строке GPS: '{line.strip()}'")
+        return None
+    return time_us, (latitude, longitude, altitude)
+
+
+# Чтение точек GPS из журнала: время (мкс) и координаты
+def read_gps_log(log_file):
+    times_us = []
+    coords = []
+    lines_read = 0
+    gps_lines = 0
+    with open(log_file, 'r') as file:
+        for line in file:
+            lines_read += 1
+            fix = parse_gps_line(line)
+            if fix is not None:
+                times_us.append(fix[0])
+                coords.append(fix[1])
+            elif line.startswith("GPS"):
+                gps_lines += 1
+    count("lines_read", lines_read)
+    count("fixes", len(coords))
+    count("lines_rejected", gps_lines)
+    return times_us, coords
+
+
+# Поиск первой строки с временем больше нуля (подходит и для открытого файла):
+# возвращает её номер от нуля, время и саму строку; first_line_number — номер первой переданной строки
+def find_first_valid_time(data_lines, first_line_number=1):
+    for index, line in enumerate(data_lines, start=first_line_number):
+        values = line.strip().split(':')
+        if len(values) < 4:
+            logging.warning(f"Строка {index} в файле данных неправильная: '{line.strip()}'")
+            continue
+        try:
+            t_data = float(values[0])
+            if t_data > 0:
+                return index - 1, t_data, line
+        except (ValueError, IndexError):
+            logging.warning(f"Ошибка в строке {index} файла данных: '{line.strip()}'")
+            continue
+    return None, None, None
+
+
+# Быстрый разбор мощностей, когда во всех строках блока одинаковое число значений:
+# числа читает встроенный в NumPy парсер. None — строки разной длины или есть ошибка.
+def _parse_uniform_powers(power_texts):
+    try:
+        powers = np.loadtxt(power_texts, dtype=np.float64, ndmin=2, comments=None)
+    except ValueError:
+        return None
+    if powers.shape[0] != len(power_texts):
+        return None  # Пустые строки loadtxt пропускает — разбираем обычным способом
+    return powers
+
+
+# Перевод полей блока строк в массивы: время, частоты и матрица мощностей (короткие строки — NaN)
+def _convert_fields(fields):
+    n = len(fields)
+    times = np.array([values[0] for _, values in fields], dtype=np.float64)
+    freq_min = np.array([values[1] for _, values in fields], dtype=np.int64)
+    freq_max = np.array([values[2] for _, values in fields], dtype=np.int64)
+    powers = _parse_uniform_powers([values[3] for _, values in fields]) if n else None
+    if powers is None:
+        split_rows = [values[3].split() for _, values in fields]
+        counts = np.fromiter(map(len, split_rows), dtype=np.int64, count=n)
+        flat = np.array(list(chain.from_iterable(split_rows)), dtype=np.float64)
+        width = int(counts.max()) if n else 0
+        powers = np.full((n, width), np.nan)
+        powers[np.arange(width) < counts[:, None]] = flat  # Заполнение по строкам
+    return times, freq_min, freq_max, powers
+
+
+# Разбор блока строк данных сразу в массивы; испорченные строки пишутся в лог и пропускаются
+# warn(вид, номер, строка) — куда сообщать об ошибке; по умолчанию сразу в лог
+def log_data_warning(kind, index, text):
+    if kind == "format":
+        logging.warning(f"Строка {index} в файле данных неправильная: '{text}'")
+    else:
+        logging.warning(f"Ошибка в строке данных {index}: '{text}'")
+
+
+def parse_data_block(lines, first_line_number, warn=log_data_warning):
+    fields = []
+    for index, line in enumerate(lines, start=first_line_number):
+        values = line.strip().split(':')
+        if len(values) < 4:
+            warn("format", index, line.strip())
+            continue
+        fields.append((index, values))
+    try:
+        block = _convert_fields(fields)
+    except (ValueError, OverflowError):
+        # В блоке есть ошибка: проверяем строки по одной и разбираем только правильные
+        good = []
+        for index, values in fields:
+            try:
+                float(values[0]), list(map(float, values[3].split()))
+                np.array([int(values[1]), int(values[2])], dtype=np.int64)
+            except (ValueError, OverflowError):
+                warn("value", index, ':'.join(values))
+                continue
+            good.append((index, values))
+        block = _convert_fields(good)
+    count("lines_read", len(lines))
+    count("lines_rejected", len(lines) - len(block[0]))
+    return block
+
+
+# Склейка разобранных блоков в одни массивы (ширина матрицы — по самому широкому блоку)
+def concat_blocks(blocks):
+    if not blocks:
+        return (np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 0)))
+    width = max(block[3].shape[1] for block in blocks)
+    powers = np.full((sum(len(block[0]) for block in blocks), width), np.nan)
+    row = 0
+    for block in blocks:
+        powers[row:row + len(block[0]), :block[3].shape[1]] = block[3]
+        row += len(block[0])
+    return (np.concatenate([block[0] for block in blocks]), np.concatenate([block[1] for block in blocks]),
+            np.concatenate([block[2] for block in blocks]), powers)
+
+
+# Разбор строк данных начиная с первой правильной, блоками по DATA_BLOCK_LINES строк
+def read_data_lines(data_lines, first_valid_index):
+    blocks = []
+    for start in range(first_valid_index, len(data_lines), DATA_BLOCK_LINES):
+        blocks.append(parse_data_block(data_lines[start:start + DATA_BLOCK_LINES], start + 1))
+    return concat_blocks(blocks)
+
+
+# Чтение пары файлов в столбцы; None, если файлов нет или в них нет нужных данных
+def read_flight_files(log_file, data_file):
+    if not os.path.exists(log_file):  # Проверка файла логов
+        logging.error(f"Файл журнала '{log_file}' не найден.")
+        print(f"Ошибка: Файл журнала '{log_file}' не найден.")
+        return None
+    logging.info("Чтение точек GPS из файла журнала...")
+    print("Чтение точек GPS из файла журнала...")
+    with stage("gps_read"):
+        gps_times_us, gps_coords = read_gps_log(log_file)
+    if not gps_coords:
+        logging.warning("Нет данных GPS для карты.")
+        print("Нет данных GPS для карты.")
+        return None
+    logging.info(f"Прочитано {len(gps_coords)} точек GPS.")
+    data = read_data_file(data_file)
+    if data is None:
+        return None
+    data_times, freq_min, freq_max, powers, first_valid_time = data
+    return {
+        "gps_times_us": np.asarray(gps_times_us, dtype=np.int64),
+        "gps_coords": np.asarray(gps_coords, dtype=np.float64).reshape(-1, 3),
+        "data_times": data_times,
+        "freq_min": freq_min,
+        "freq_max": freq_max,
+        "powers": powers,
+        "first_valid_time": first_valid_time
+    }
+
+
+# Чтение файла данных в столбцы и время первой правильной строки; None, если файла нет или в нём нет времени
+def read_data_file(data_file):
+    if not os.path.isfile(data_file):  # Проверка файла данных
+        logging.error(f"Файл данных '{data_file}' не найден.")
+        print(f"Файл данных '{data_file}' не найден.")
+        return None
+    logging.info("Поиск первого правильного времени в файле данных...")
+    print("Поиск первого правильного времени в файле данных...")
+    with stage("first_valid_scan"):
+        with open(data_file, 'r') as df:
+            data_lines = df.readlines()
+        first_valid_index, first_valid_time, _ = find_first_valid_time(data_lines)
+        count("lines_read", len(data_lines))
+        count("lines_skipped", first_valid_index if first_valid_index is not None else len(data_lines))
+    if first_valid_index is None:
+        logging.error("Нет правильного времени в файле данных.")
+        print("Нет правильного времени в файле данных.")
+        return None
+    logging.info("Чтение файла данных...")
+    print("Чтение файла данных...")
+    with stage("data_parse"):
+        data_times, freq_min, freq_max, powers = read_data_lines(data_lines, first_valid_index)
+    return data_times, freq_min, freq_max, powers, first_valid_time
+
+
+# Отобранная точка в том виде, в котором её показывают и сохраняют
+# bins — номера значений valid_powers в строке мощностей (с нуля), чтобы было видно, к какой полосе относится значение
+def make_point(coords, timestamp, freq_min, freq_max, valid_powers, bins=None):
+    return {
+        "coords": coords,
+        "timestamp": timestamp,
+        "freq_min": freq_min,
+        "freq_max": freq_max,
+        "powers": valid_powers,
+        "bins": bins
+    }
+
+
+# Строка для файла отобранных данных
+def format_filtered_line(relative_time, freq_min, freq_max, valid_powers):
+    formatted_powers = " ".join(f"{p:.1f}" for p in valid_powers)
+    return f"{relative_time:.3f}:{freq_min:04d}:{freq_max:04d}: {formatted_powers}\n"
+
+
+# Маска строк, у которых обе частоты лежат в диапазоне отбора
+def band_mask(freq_min, freq_max, min_frequency, max_frequency):
+    return ((min_frequency <= freq_min) & (freq_min <= max_frequency) &
+            (min_frequency <= freq_max) & (freq_max <= max_frequency))
+
+
+# Маска строк по параметрам отбора и маска значений мощности выше порога
+def filter_rows(matched, freq_min, freq_max, powers, min_frequency, max_frequency, min_power_db):
+    above = powers > min_power_db  # NaN-дополнение сюда не попадает
+    return matched & band_mask(freq_min, freq_max, min_frequency, max_frequency) & above.any(axis=1), above
+
+
+# Точки и строки для отобранных строк массивов
+def build_filtered_output(first_gps_time, relative_times, freq_mins, freq_maxs, coords, powers, above):
+    filtered_data_points = []
+    filtered_lines = []
+    for row in range(len(relative_times)):
+        relative_time = float(relative_times[row])
+        freq_min = int(freq_mins[row])
+        freq_max = int(freq_maxs[row])
+        valid_powers = powers[row][above[row]].tolist()
+        filtered_data_points.append(make_point(tuple(coords[row].tolist()),
+                                               first_gps_time + timedelta(seconds=relative_time),
+                                               freq_min, freq_max, valid_powers, np.flatnonzero(above[row]).tolist()))
+        filtered_lines.append(format_filtered_line(relative_time, freq_min, freq_max, valid_powers))
+    return filtered_data_points, filtered_lines
+
+
+# БЛОК 3: Точки GPS для сопоставления
+# Точки GPS для индекса: время первой точки файла и отсортированные секунды с координатами;
+# base_time — момент, от которого отсчитано время точек (для склеенного полёта — начало отсчёта GPS)
+def prepare_gps(gps_times_us, gps_coords, base_time=GPS_BASE_DATE):
+    times_us = np.asarray(gps_times_us, dtype=np.int64)
+    gps_seconds = (times_us - times_us[0]) / 1_000_000
+    order = np.argsort(gps_seconds, kind='stable')
+    first_gps_time = base_time + timedelta(seconds=int(times_us[0]) / 1_000_000)
+    coords = np.asarray(gps_coords, dtype=np.float64).reshape(-1, 3)[order]
+    return first_gps_time, gps_seconds[order], coords
+
+
+# БЛОК 4: Сессия с данными полёта
+class FlightSession:
+    def __init__(self, gps_times_us, gps_coords, data_times, freq_min, freq_max, powers,
+                 first_valid_time, interpolate=False, base_time=GPS_BASE_DATE, track_options=None):
+        # Точки GPS: секунды от первой точки файла, отсортированные по времени
+        self.first_gps_time, self.gps_time, coords = prepare_gps(gps_times_us, gps_coords, base_time)
+        if track_options:  # Упрощённый трек заменяет исходный и для сопоставления, и для линии трека
+            self.gps_time, coords = reduce_track(self.gps_time, coords, track_options, interpolate)
+        self.gps_lat = coords[:, 0]
+        self.gps_lon = coords[:, 1]
+        self.gps_alt = coords[:, 2]
+        # Измерения: время относительно первой правильной строки, частоты и матрица мощностей
+        self.first_valid_time = first_valid_time
+        self.data_time = np.asarray(data_times, dtype=np.float64) - first_valid_time
+        self.freq_min = np.asarray(freq_min, dtype=np.int64)
+        self.freq_max = np.asarray(freq_max, dtype=np.int64)
+        self.powers = np.asarray(powers, dtype=np.float64)
+        # Сопоставление по времени считается один раз на всю сессию
+        self.interpolate = interpolate
+        with stage("match"):
+            targets = np.round(self.data_time, 6)  # Как timedelta: точность до микросекунды
+            self.match_idx, self.match_coords = match_times(self.gps_time, coords, targets,
+                                                            MATCH_TOLERANCE_SEC, interpolate)
+            self.matched = self.match_idx >= 0
+            count("matched", int(self.matched.sum()))
+            count("unmatched", int((~self.matched).sum()))
+
+    @classmethod
+    def from_columns(cls, columns, interpolate=False, track_options=None):
+        return cls(columns['gps_times_us'], columns['gps_coords'], columns['data_times'], columns['freq_min'],
+                   columns['freq_max'], columns['powers'], columns['first_valid_time'], interpolate,
+                   columns.get('base_time', GPS_BASE_DATE), track_options)
+
+    @classmethod
+    def load(cls, log_file, data_file, interpolate=False, use_cache=True, track_options=None):
+        columns = None
+        if use_cache:
+            with stage("cache_load"):
+                columns = load_cached_columns(log_file, data_file)
+        if columns is None:
+            key = source_cache_key(log_file, data_file) if use_cache else None  # До чтения, а не после
+            columns = read_flight_files(log_file, data_file)
+            if columns is None:
+                return None
+            if use_cache:
+                save_cached_columns(log_file, data_file, columns, key)
+        else:
+            logging.info("Данные прочитаны из кэша.")
+            print("Данные прочитаны из кэша.")
+        session = cls.from_columns(columns, interpolate, track_options)
+        logging.info(f"Прочитано {len(session.data_time)} строк данных, "
+                     f"из них {int(session.matched.sum())} сопоставлено с GPS.")
+        return session
+
+    # Линия трека полёта для карты и KML: точки (широта, долгота, высота), упрощённые с границей tolerance_m
+    def track_line(self, tolerance_m=TRACK_DISPLAY_TOLERANCE_M):
+        coords = np.column_stack((self.gps_lat, self.gps_lon, self.gps_alt))
+        keep = simplify_track(self.gps_time, coords, 'dp', tolerance_m, max_gap_sec=None)
+        return [tuple(point) for point in coords[keep].tolist()]
+
+    # Маска строк по параметрам отбора
+    def filter_mask(self, min_frequency, max_frequency, min_power_db):
+        return filter_rows(self.matched, self.freq_min, self.freq_max, self.powers,
+                           min_frequency, max_frequency, min_power_db)
+
+    # Отбор по новым параметрам: возвращает точки и строки в том же виде, что и раньше
+    def filter(self, min_frequency, max_frequency, min_power_db):
+        with stage("filter"):
+            mask, above = self.filter_mask(min_frequency, max_frequency, min_power_db)
+            rows = np.flatnonzero(mask)
+            count("rows", len(self.data_time))
+            count("points", len(rows))
+            return build_filtered_output(self.first_gps_time, self.data_time[rows], self.freq_min[rows],
+                                         self.freq_max[rows], self.match_coords[rows], self.powers[rows], above[rows])
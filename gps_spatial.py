@@ -0,0 +1,178 @@
+# Пространственный индекс отобранных точек для разбора после полёта.
+# Координаты переводятся в метры на местной плоскости, точки раскладываются по квадратным ячейкам
+# и сортируются по номеру ячейки: запрос смотрит только ячейки рядом с областью, а не все точки.
+# Номер точки в ответе — это номер в filtered_data_points и строка в отобранном файле .data.
+import math  # Для перевода метров в градусы
+import argparse  # Для запуска из терминала
+
+import numpy as np  # Для столбцов индекса
+
+from gps_map import METERS_PER_DEGREE  # Метров в градусе широты
+
+# БЛОК 1: Настройки
+SPATIAL_CELL_METERS = 100.0  # Размер ячейки индекса, м
+SPATIAL_FILE_SUFFIX = "_spatial.npz"  # Файл индекса рядом с отобранными данными
+SPATIAL_ARRAYS = ("lat", "lon", "alt", "timestamp", "freq_min", "freq_max", "max_power", "order", "keys")
+
+
+# БЛОК 2: Индекс
+class SpatialIndex:
+    def __init__(self, lat, lon, alt, timestamp, freq_min, freq_max, max_power,
+                 cell_meters=SPATIAL_CELL_METERS, order=None, keys=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.alt = np.asarray(alt, dtype=np.float64)
+        self.timestamp = np.asarray(timestamp, dtype='datetime64[us]')
+        self.freq_min = np.asarray(freq_min, dtype=np.int64)
+        self.freq_max = np.asarray(freq_max, dtype=np.int64)
+        self.max_power = np.asarray(max_power, dtype=np.float64)
+        self.cell_meters = float(cell_meters)
+        # Начало местной плоскости — юго-западный угол точек, масштаб долготы — по средней широте
+        self.lat0 = float(self.lat.min()) if len(self.lat) else 0.0
+        self.lon0 = float(self.lon.min()) if len(self.lon) else 0.0
+        mean_lat = float(self.lat.mean()) if len(self.lat) else 0.0
+        self.meters_per_lon = METERS_PER_DEGREE * max(math.cos(math.radians(mean_lat)), 1e-6)
+        self.x, self.y = self.project(self.lat, self.lon)
+        self.columns = int(np.floor(self.x.max() / self.cell_meters)) + 1 if len(self.x) else 0
+        self.rows = int(np.floor(self.y.max() / self.cell_meters)) + 1 if len(self.y) else 0
+        if order is None:
+            cell_keys = self._cell_keys(self.x, self.y)
+            order = np.argsort(cell_keys, kind='stable')
+            keys = cell_keys[order]
+        self.order = np.asarray(order, dtype=np.int64)  # Номера точек по возрастанию ячейки
+        self.keys = np.asarray(keys, dtype=np.int64)  # Ячейка каждой точки в этом порядке
+
+    @classmethod
+    def from_points(cls, filtered_data_points, cell_meters=SPATIAL_CELL_METERS):
+        return cls([data['coords'][0] for data in filtered_data_points],
+                   [data['coords'][1] for data in filtered_data_points],
+                   [data['coords'][2] for data in filtered_data_points],
+                   [data['timestamp'] for data in filtered_data_points],
+                   [data['freq_min'] for data in filtered_data_points],
+                   [data['freq_max'] for data in filtered_data_points],
+                   [max(data['powers']) for data in filtered_data_points],
+                   cell_meters)
+
+    def __len__(self):
+        return len(self.lat)
+
+    # Широта и долгота в метры на местной плоскости (для областей размером с полёт)
+    def project(self, lat, lon):
+        return ((np.asarray(lon, dtype=np.float64) - self.lon0) * self.meters_per_lon,
+                (np.asarray(lat, dtype=np.float64) - self.lat0) * METERS_PER_DEGREE)
+
+    # Номер ячейки: столбец * число строк + строка, так что ячейки одного столбца идут подряд
+    def _cell_keys(self, x, y):
+        column = np.floor(x / self.cell_meters).astype(np.int64)
+        row = np.floor(y / self.cell_meters).astype(np.int64)
+        return column * self.rows + row
+
+    # Номера точек в прямоугольнике местной плоскости: по срезу отсортированных точек на столбец ячеек
+    def _candidates(self, x_min, y_min, x_max, y_max):
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        column_from = max(int(math.floor(x_min / self.cell_meters)), 0)
+        column_to = min(int(math.floor(x_max / self.cell_meters)), self.columns - 1)
+        row_from = max(int(math.floor(y_min / self.cell_meters)), 0)
+        row_to = min(int(math.floor(y_max / self.cell_meters)), self.rows - 1)
+        if column_from > column_to or row_from > row_to:
+            return np.empty(0, dtype=np.int64)
+        columns = np.arange(column_from, column_to + 1, dtype=np.int64)
+        starts = np.searchsorted(self.keys, columns * self.rows + row_from, side='left')
+        ends = np.searchsorted(self.keys, columns * self.rows + row_to, side='right')
+        slices = [self.order[start:end] for start, end in zip(starts, ends) if end > start]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    # БЛОК 3: Запросы
+    # Все точки внутри прямоугольника широт и долгот (по возрастанию номера)
+    def bbox(self, south, west, north, east):
+        x_min, y_min = self.project(south, west)
+        x_max, y_max = self.project(north, east)
+        rows = self._candidates(x_min, y_min, x_max, y_max)
+        inside = ((self.lat[rows] >= south) & (self.lat[rows] <= north) &
+                  (self.lon[rows] >= west) & (self.lon[rows] <= east))
+        return np.sort(rows[inside])
+
+    # Точки не дальше radius_m метров: номера и расстояния по возрастанию расстояния
+    def radius(self, lat, lon, radius_m):
+        x, y = self.project(lat, lon)
+        rows = self._candidates(x - radius_m, y - radius_m, x + radius_m, y + radius_m)
+        distances = np.hypot(self.x[rows] - x, self.y[rows] - y)
+        close = distances <= radius_m
+        rows, distances = rows[close], distances[close]
+        order = np.lexsort((rows, distances))
+        return rows[order], distances[order]
+
+    # k ближайших точек: круг поиска удваивается, пока в нём не окажется k точек
+    def nearest(self, lat, lon, k=1):
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        x, y = self.project(lat, lon)
+        extent = math.hypot(max(abs(x), abs(x - self.columns * self.cell_meters)),
+                            max(abs(y), abs(y - self.rows * self.cell_meters)))
+        radius_m = self.cell_meters
+        while True:
+            rows, distances = self.radius(lat, lon, radius_m)
+            if len(rows) >= k or radius_m >= extent:
+                return rows[:k], distances[:k]
+            radius_m *= 2
+
+    # Точка с самой большой мощностью не дальше radius_m метров (None, если таких нет)
+    def strongest_within(self, lat, lon, radius_m):
+        rows, distances = self.radius(lat, lon, radius_m)
+        if not len(rows):
+            return None
+        best = int(np.argmax(self.max_power[rows]))  # При равной мощности — ближайшая
+        return int(rows[best]), float(distances[best])
+
+    # Описание точки для вывода
+    def describe(self, row):
+        return (f"Точка {row + 1}: Широта {self.lat[row]:.6f}, Долгота {self.lon[row]:.6f}, "
+                f"Высота {self.alt[row]:.2f} м, Время {str(self.timestamp[row])[11:19]}, "
+                f"Частоты {self.freq_min[row]} - {self.freq_max[row]} МГц, Макс. мощность {self.max_power[row]:.1f} дБ")
+
+    # БЛОК 4: Сохранение и чтение
+    def save(self, path):
+        np.savez(path, cell_meters=np.float64(self.cell_meters),
+                 **{name: getattr(self, name) for name in SPATIAL_ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            arrays = {name: f[name] for name in SPATIAL_ARRAYS}
+            cell_meters = float(f["cell_meters"])
+        return cls(cell_meters=cell_meters, **arrays)
+
+
+# БЛОК 5: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запросы к пространственному индексу отобранных точек (*_spatial.npz).")
+    parser.add_argument("index_file", help="файл индекса (*_spatial.npz)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bbox_parser = commands.add_parser("bbox", help="точки в прямоугольнике")
+    for name in ("south", "west", "north", "east"):
+        bbox_parser.add_argument(name, type=float)
+    radius_parser = commands.add_parser("radius", help="точки в круге")
+    radius_parser.add_argument("lat", type=float)
+    radius_parser.add_argument("lon", type=float)
+    radius_parser.add_argument("radius_m", type=float, help="радиус, м")
+    radius_parser.add_argument("--strongest", action="store_true", help="показать только самую сильную точку")
+    nearest_parser = commands.add_parser("nearest", help="k ближайших точек")
+    nearest_parser.add_argument("lat", type=float)
+    nearest_parser.add_argument("lon", type=float)
+    nearest_parser.add_argument("-k", type=int, default=1, help="число точек")
+    args = parser.parse_args()
+    index = SpatialIndex.load(args.index_file)
+    if args.command == "bbox":
+        found = index.bbox(args.south, args.west, args.north, args.east)
+        distances = None
+    elif args.command == "radius" and args.strongest:
+        best = index.strongest_within(args.lat, args.lon, args.radius_m)
+        found, distances = ([best[0]], [best[1]]) if best else ([], [])
+    elif args.command == "radius":
+        found, distances = index.radius(args.lat, args.lon, args.radius_m)
+    else:
+        found, distances = index.nearest(args.lat, args.lon, args.k)
+    print(f"Найдено {len(found)} точек.")
+    for i, row in enumerate(found):
+        print(index.describe(row) + (f", Расстояние {distances[i]:.1f} м" if distances is not None else ""))
@@ -0,0 +1,231 @@
+# Потоковая обработка файла .data: строки читаются блоками, сразу сопоставляются
+# с индексом GPS и пишутся в выходные файлы, поэтому память не растёт вместе с файлом.
+import os  # Для проверки путей
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+from datetime import timedelta  # Для времени измерений
+from itertools import islice  # Для чтения файла блоками
+
+import numpy as np  # Для масок по блоку строк
+
+from gps_matcher import GpsTimeIndex, MATCH_TOLERANCE_SEC  # Индекс GPS по времени
+from gps_session import (GPS_BASE_DATE, DATA_BLOCK_LINES, read_gps_log, find_first_valid_time,
+                         parse_data_block, filter_rows, make_point, format_filtered_line)
+from gps_kml import KmlWriter, add_kml_arguments, kml_options_from_args  # Потоковая запись KML/KMZ
+from gps_metrics import stage, count, add_metrics_arguments, configure_from_args  # Замеры по этапам
+from gps_columnar import ColumnarWriter, COLUMNAR_BATCH_ROWS, columnar_filename  # Таблица Parquet/Arrow/CSV
+from gps_data_visualization import (FILTERED_FILE_SUFFIX, make_base_filename, print_point,
+                                    kml_description, kml_filename)
+
+
+STREAM_ACTIONS = ('1', '2', '3', '6')  # Действия, которые пишутся потоком; '5' — все они
+
+# БЛОК 1: Приёмники — пишут каждую точку сразу, ничего не накапливая
+# Отобранные строки в файл .data
+class FilteredDataSink:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w')
+
+    def write(self, number, point, line):
+        self.file.write(line)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        logging.info(f"Отобранные данные сохранены в файл: {self.path}")
+
+
+# Точки в KML/KMZ: по одной метке на точку, папки и трек — по настройкам записи
+class KmlSink:
+    def __init__(self, path, **kml_options):
+        self.path = path
+        self.writer = KmlWriter(path, **kml_options)
+
+    def write(self, number, point, line):
+        self.writer.add_point(number, point, kml_description(point))
+
+    def flush(self):
+        pass  # KML становится правильным документом только после закрытия
+
+    def close(self):
+        self.writer.close()
+        logging.info(f"Карта сохранена как KML в файл: {self.path}")
+
+
+# Точки в таблицу: копятся до COLUMNAR_BATCH_ROWS и пишутся одной порцией
+class TableSink:
+    def __init__(self, path):
+        self.path = path
+        self.writer = ColumnarWriter(path)
+        self.batch = []
+
+    def write(self, number, point, line):
+        self.batch.append(point)
+        if len(self.batch) >= COLUMNAR_BATCH_ROWS:
+            self.writer.write_points(self.batch)
+            self.batch = []
+
+    def flush(self):
+        pass  # Parquet и Arrow становятся правильными файлами только после закрытия
+
+    def close(self):
+        if self.batch:
+            self.writer.write_points(self.batch)
+            self.batch = []
+        self.writer.close()
+        logging.info(f"Таблица сохранена в файл: {self.path}")
+
+
+# Показ точек в консоли по мере нахождения
+class PointPrintSink:
+    def __init__(self):
+        print("\n--- Все найденные точки ---")
+
+    def write(self, number, point, line):
+        print_point(number, point)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# БЛОК 2: Потоковый отбор
+# Отбор в разобранном блоке: частоты и мощности проверяются масками, время — индексом GPS сразу для блока
+def _filter_block(block, first_valid_time, first_gps_time, gps_index, min_frequency, max_frequency,
+                  min_power_db, interpolate=False):
+    times, freq_mins, freq_maxs, powers = block
+    mask, above = filter_rows(True, freq_mins, freq_maxs, powers, min_frequency, max_frequency, min_power_db)
+    rows = np.flatnonzero(mask)
+    relative_times = times[rows] - first_valid_time
+    match_idx, match_coords = gps_index.match_many(np.round(relative_times, 6), MATCH_TOLERANCE_SEC, interpolate)
+    for k in np.flatnonzero(match_idx >= 0):
+        row = rows[k]
+        relative_time = float(relative_times[k])
+        freq_min = int(freq_mins[row])
+        freq_max = int(freq_maxs[row])
+        valid_powers = powers[row][above[row]].tolist()
+        point = make_point(tuple(match_coords[k].tolist()), first_gps_time + timedelta(seconds=relative_time),
+                           freq_min, freq_max, valid_powers, np.flatnonzero(above[row]).tolist())
+        yield point, format_filtered_line(relative_time, freq_min, freq_max, valid_powers)
+
+
+# Файл данных читается блоками по DATA_BLOCK_LINES строк, в памяти только текущий блок
+def iter_filtered(data_file, gps_index, first_gps_time, min_frequency, max_frequency, min_power_db,
+                  interpolate=False):
+    with open(data_file, 'r') as df:
+        first_valid_index, first_valid_time, first_line = find_first_valid_time(df)
+        if first_valid_index is None:
+            logging.error("Нет правильного времени в файле данных.")
+            print("Нет правильного времени в файле данных.")
+            return
+        pending = [first_line]  # Строка с первым правильным временем уже прочитана
+        line_number = first_valid_index + 1
+        while True:
+            lines = pending + list(islice(df, DATA_BLOCK_LINES - len(pending)))
+            pending = []
+            if not lines:
+                break
+            block = parse_data_block(lines, line_number)
+            line_number += len(lines)
+            yield from _filter_block(block, first_valid_time, first_gps_time, gps_index,
+                                     min_frequency, max_frequency, min_power_db, interpolate)
+
+
+# Полный проход: журнал GPS в индекс, файл данных — потоком в приёмники
+def stream_log_to_outputs(log_file, data_file, min_frequency, max_frequency, min_power_db, sinks,
+                          interpolate=False):
+    try:
+        return _stream_to_sinks(log_file, data_file, min_frequency, max_frequency, min_power_db, sinks,
+                                interpolate)
+    finally:
+        for sink in sinks:
+            sink.close()  # Файлы закрываются и при ошибке
+
+
+def _stream_to_sinks(log_file, data_file, min_frequency, max_frequency, min_power_db, sinks, interpolate):
+    if not os.path.exists(log_file):
+        logging.error(f"Файл журнала '{log_file}' не найден.")
+        print(f"Ошибка: Файл журнала '{log_file}' не найден.")
+        return None
+    if not os.path.isfile(data_file):
+        logging.error(f"Файл данных '{data_file}' не найден.")
+        print(f"Файл данных '{data_file}' не найден.")
+        return None
+    logging.info("Чтение точек GPS из файла журнала...")
+    print("Чтение точек GPS из файла журнала...")
+    with stage("gps_read"):
+        gps_times_us, gps_coords = read_gps_log(log_file)
+    if not gps_coords:
+        logging.warning("Нет данных GPS для карты.")
+        print("Нет данных GPS для карты.")
+        return None
+    logging.info(f"Прочитано {len(gps_coords)} точек GPS.")
+    gps_index = GpsTimeIndex.from_fixes(gps_times_us, gps_coords)
+    first_gps_time = GPS_BASE_DATE + timedelta(seconds=gps_times_us[0] / 1_000_000)
+    logging.info("Потоковая обработка файла данных...")
+    print("Потоковая обработка файла данных...")
+    matches = 0
+    with stage("stream"):  # Разбор, сопоставление, отбор и запись идут вперемешку
+        for point, line in iter_filtered(data_file, gps_index, first_gps_time, min_frequency,
+                                         max_frequency, min_power_db, interpolate):
+            matches += 1
+            for sink in sinks:
+                sink.write(matches, point, line)
+        count("points", matches)
+    logging.info(f"Найдено {matches} точек по параметрам отбора.")
+    print(f"Найдено {matches} точек по параметрам отбора.")
+    return matches
+
+
+# Приёмники по номерам действий: 1 — показ точек, 2 — файл .data, 3 — KML, 6 — таблица, 5 — все, как в perform_save
+def make_sinks(actions, min_frequency, max_frequency, min_power_db, output_dir='.', kml_options=None):
+    if '5' in actions:
+        actions = STREAM_ACTIONS
+    base_filename = os.path.join(output_dir, make_base_filename(min_frequency, max_frequency, min_power_db))
+    sinks = []
+    if '1' in actions:
+        sinks.append(PointPrintSink())
+    if '2' in actions:
+        sinks.append(FilteredDataSink(base_filename + FILTERED_FILE_SUFFIX))
+    if '3' in actions:
+        sinks.append(KmlSink(kml_filename(base_filename, kml_options), **(kml_options or {})))
+    if '6' in actions:
+        sinks.append(TableSink(columnar_filename(base_filename)))
+    return sinks
+
+
+# БЛОК 3: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Потоковый отбор данных .data по журналу GPS с постоянной памятью.")
+    parser.add_argument("log_file", help="файл журнала GPS (.log)")
+    parser.add_argument("data_file", help="файл данных (.data)")
+    parser.add_argument("--min-freq", type=int, required=True, help="минимальная частота, МГц")
+    parser.add_argument("--max-freq", type=int, required=True, help="максимальная частота, МГц")
+    parser.add_argument("--min-power", type=float, required=True, help="минимальная мощность, дБ")
+    parser.add_argument("--actions", default="2,3", help="номера действий через запятую: 1 — показ, 2 — .data, 3 — KML, 6 — таблица, 5 — всё")
+    parser.add_argument("--output-dir", default=".", help="папка для результатов")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    add_kml_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.min_freq > args.max_freq:
+        parser.error("Максимальная частота должна быть не меньше минимальной.")
+    chosen = args.actions.replace(',', ' ').split()
+    unsupported = [action for action in chosen if action not in STREAM_ACTIONS + ('5',)]
+    if unsupported:  # Карта HTML (4) требует всех точек в памяти, в потоковом режиме её нет
+        parser.error(f"Действия {', '.join(unsupported)} не поддерживаются в потоковом режиме. "
+                     f"Возможные: 1, 2, 3, 6 и 5 — всё.")
+    configure_from_args(args)
+    for input_file in (args.log_file, args.data_file):  # До открытия выходных файлов, чтобы не оставить пустые
+        if not os.path.isfile(input_file):
+            parser.error(f"Файл '{input_file}' не найден.")
+    os.makedirs(args.output_dir, exist_ok=True)
+    stream_log_to_outputs(args.log_file, args.data_file, args.min_freq, args.max_freq, args.min_power,
+                          make_sinks(chosen, args.min_freq, args.max_freq, args.min_power, args.output_dir,
+                                     kml_options_from_args(args)),
+                          args.interpolate)
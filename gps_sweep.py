@@ -0,0 +1,124 @@
+# Несколько наборов параметров отбора за один проход по сопоставленным данным.
+# Файлы читаются и сопоставляются по времени один раз, затем для каждого набора считается
+# только маска по уже готовым массивам, и результаты сохраняются как при обычном отборе.
+import os  # Для путей
+import json  # Для файла наборов в JSON
+import logging  # Для записи логов
+import argparse  # Для запуска из терминала
+
+import numpy as np  # Для масок
+
+from gps_session import FlightSession, band_mask, build_filtered_output  # Чтение пары файлов и отбор
+from gps_map import MAP_MODES  # Режимы карты 2D
+from gps_kml import add_kml_arguments, kml_options_from_args  # Настройки записи KML/KMZ
+from gps_track import add_track_arguments, track_options_from_args  # Упрощение и линия трека
+from gps_metrics import stage, count, add_metrics_arguments, configure_from_args  # Замеры по этапам
+from gps_data_visualization import perform_save  # Сохранение результатов
+
+
+# БЛОК 1: Чтение наборов параметров
+# Файл .json — список объектов {"min_freq": ..., "max_freq": ..., "min_power": ...};
+# любой другой — строки "мин. частота, макс. частота, мин. мощность" (через запятую или пробел, # — комментарий)
+def load_profiles(path):
+    with open(path, 'r') as f:
+        if path.lower().endswith('.json'):
+            rows = [(item["min_freq"], item["max_freq"], item["min_power"]) for item in json.load(f)]
+        else:
+            rows = []
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    rows.append(line.replace(',', ' ').split()[:3])
+    profiles = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            min_frequency, max_frequency, min_power_db = int(row[0]), int(row[1]), float(row[2])
+        except (ValueError, IndexError, TypeError):
+            raise ValueError(f"Набор {number} в файле '{path}' неправильный: {row}")
+        if min_frequency > max_frequency:
+            raise ValueError(f"Набор {number} в файле '{path}': максимальная частота меньше минимальной.")
+        if (min_frequency, max_frequency, min_power_db) in profiles:
+            logging.warning(f"Набор {number} повторяется, пропускаем: {min_frequency}-{max_frequency} МГц, {min_power_db} дБ.")
+            continue
+        profiles.append((min_frequency, max_frequency, min_power_db))
+    return profiles
+
+
+# БЛОК 2: Отбор по всем наборам
+# Маски считаются только по сопоставленным строкам; сравнение мощностей с порогом
+# делается один раз на каждый разный порог, даже если он встречается в нескольких наборах.
+# Для порога хранится только признак строки (есть ли значения выше), а не маска всей матрицы мощностей:
+# маска значений нужна лишь для отобранных строк и строится заново, так память не растёт с числом порогов
+def sweep_session(session, profiles):
+    rows = np.flatnonzero(session.matched)
+    data_time = session.data_time[rows]
+    freq_min = session.freq_min[rows]
+    freq_max = session.freq_max[rows]
+    coords = session.match_coords[rows]
+    powers = session.powers[rows]
+    any_above_by_power = {}  # Порог -> есть ли в строке значения выше порога
+    for min_frequency, max_frequency, min_power_db in profiles:
+        with stage("filter"):
+            if min_power_db not in any_above_by_power:
+                any_above_by_power[min_power_db] = (powers > min_power_db).any(axis=1)  # NaN-дополнение сюда не попадает
+            any_above = any_above_by_power[min_power_db]
+            selected = np.flatnonzero(band_mask(freq_min, freq_max, min_frequency, max_frequency) & any_above)
+            count("rows", len(rows))
+            count("points", len(selected))
+            selected_powers = powers[selected]
+            output = build_filtered_output(session.first_gps_time, data_time[selected], freq_min[selected],
+                                           freq_max[selected], coords[selected], selected_powers,
+                                           selected_powers > min_power_db)
+        yield (min_frequency, max_frequency, min_power_db), output
+
+
+def run_sweep(log_file, data_file, profiles, actions, output_dir='.', interpolate=False, use_cache=True,
+              map_mode=None, kml_options=None, track_options=None, draw_track=False):
+    session = FlightSession.load(log_file, data_file, interpolate, use_cache, track_options)
+    if session is None:
+        return None
+    track = session.track_line() if draw_track else None  # Одна линия трека на все наборы
+    os.makedirs(output_dir, exist_ok=True)
+    logging.info(f"Отбор по {len(profiles)} наборам параметров...")
+    print(f"Отбор по {len(profiles)} наборам параметров...")
+    results = []
+    for (min_frequency, max_frequency, min_power_db), (filtered_data_points, filtered_lines) in sweep_session(session, profiles):
+        logging.info(f"Набор {min_frequency}-{max_frequency} МГц, {min_power_db} дБ: найдено {len(filtered_data_points)} точек.")
+        perform_save(filtered_data_points, filtered_lines, None, min_frequency, max_frequency, min_power_db,
+                     actions, output_dir=output_dir, kml_options=kml_options, map_mode=map_mode, track=track)
+        results.append((min_frequency, max_frequency, min_power_db, len(filtered_data_points)))
+    print_summary(results)
+    return results
+
+
+def print_summary(results):
+    header = f"{'Мин. частота':>13} {'Макс. частота':>14} {'Мин. мощность':>14} {'Точек':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for min_frequency, max_frequency, min_power_db, points in results:
+        print(f"{min_frequency:>13} {max_frequency:>14} {min_power_db:>14.2f} {points:>8}")
+
+
+# БЛОК 3: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отбор по нескольким наборам параметров за одно чтение файлов.")
+    parser.add_argument("log_file", help="файл журнала GPS (.log)")
+    parser.add_argument("data_file", help="файл данных (.data)")
+    parser.add_argument("profiles", help="файл наборов: .json или строки 'мин. частота, макс. частота, мин. мощность'")
+    parser.add_argument("--actions", default="2,3", help="номера действий через запятую: 1 — показ, 2 — .data, 3 — KML, 4 — HTML, 6 — таблица")
+    parser.add_argument("--output-dir", default=".", help="папка для результатов")
+    parser.add_argument("--interpolate", action="store_true", help="интерполировать координаты между точками GPS")
+    parser.add_argument("--map-mode", choices=MAP_MODES, default=None, help="режим карты HTML (по умолчанию 'auto')")
+    parser.add_argument("--no-cache", action="store_true", help="не читать и не писать кэш разобранных файлов")
+    add_kml_arguments(parser)
+    add_track_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    try:
+        sweep_profiles = load_profiles(args.profiles)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f"Не удалось прочитать наборы параметров: {e}")
+    run_sweep(args.log_file, args.data_file, sweep_profiles, args.actions.replace(',', ' ').split(),
+              args.output_dir, args.interpolate, not args.no_cache, args.map_mode, kml_options_from_args(args),
+              track_options_from_args(args), args.draw_track)
@@ -0,0 +1,118 @@
+# Генератор искусственных полётов: журнал .log со строками GPS и файл .data со спектром.
+# Форматы такие же, как у настоящих файлов, поэтому их читает обычный разбор.
+# Траектория — плавный облёт с поворотами, мощность — шум плюс сигнал от нескольких источников,
+# который падает с расстоянием. Одинаковый seed даёт одинаковые файлы.
+import math  # Для перевода метров в градусы
+import argparse  # Для запуска из терминала
+
+import numpy as np  # Для траектории и мощностей
+
+from gps_map import METERS_PER_DEGREE  # Метров в градусе широты
+
+# БЛОК 1: Настройки по умолчанию
+SYNTH_DURATION_SEC = 600.0  # Длительность полёта, с
+SYNTH_GPS_RATE_HZ = 5.0  # Точек GPS в секунду
+SYNTH_DATA_RATE_HZ = 30.0  # Строк данных в секунду
+SYNTH_POWER_COLUMNS = 15  # Значений мощности в строке
+SYNTH_BANDS = ((0, 1000), (1000, 2000), (2000, 3000))  # Диапазоны частот по очереди, МГц
+SYNTH_EMITTERS = 5  # Источников сигнала вокруг трека
+SYNTH_START = (56.3230086, 53.7558019, 166.0)  # Широта, долгота и высота начала полёта
+SYNTH_SPEED_MPS = 15.0  # Скорость полёта, м/с
+SYNTH_BAD_FIX_RATE = 0.02  # Доля точек GPS с плохим статусом
+SYNTH_START_TIME_US = 908_419_406  # TimeUS первой точки GPS
+SYNTH_DATA_START_SEC = 900.137  # Время первой строки данных по часам приёмника
+SYNTH_BLOCK_LINES = 65536  # Строк, которые готовятся и пишутся за раз
+GPS_LOG_HEADER = "FMT, 90, 51, GPS, QBBIHBcLLeffffB, TimeUS,I,Status,GMS,GWk,NSats,HDop,Lat,Lng,Alt,Spd,GCrs,VZ,Yaw,U\n"
+
+
+# БЛОК 2: Траектория
+# Координаты в моменты times: курс меняется плавно, высота колеблется около начальной
+def flight_path(times, rng, start=SYNTH_START, speed_mps=SYNTH_SPEED_MPS):
+    turn_rate = np.cumsum(rng.normal(0.0, 0.002, len(times)))  # Рад/с, медленно блуждает
+    turn_rate = np.clip(turn_rate, -0.05, 0.05)
+    dt = np.diff(times, prepend=times[0] if len(times) else 0.0)
+    heading = np.cumsum(turn_rate * dt)
+    north = np.cumsum(speed_mps * dt * np.cos(heading))
+    east = np.cumsum(speed_mps * dt * np.sin(heading))
+    lat = start[0] + north / METERS_PER_DEGREE
+    lon = start[1] + east / (METERS_PER_DEGREE * math.cos(math.radians(start[0])))
+    alt = start[2] + 20.0 * np.sin(times / 60.0) + np.cumsum(rng.normal(0.0, 0.05, len(times)))
+    return lat, lon, alt
+
+
+# БЛОК 3: Запись файлов
+def write_gps_log(log_file, gps_times, lat, lon, alt, rng, bad_fix_rate=SYNTH_BAD_FIX_RATE):
+    status = np.where(rng.random(len(gps_times)) < bad_fix_rate, 1, 3)
+    status[:1] = 3  # Первая точка задаёт начало отсчёта и совпадает с первой строкой данных
+    time_us = SYNTH_START_TIME_US + np.round(gps_times * 1_000_000).astype(np.int64)
+    gms = 207_781_000 + (time_us - SYNTH_START_TIME_US) // 1000  # Время недели GPS, мс
+    sats = rng.integers(8, 16, len(gps_times))
+    with open(log_file, 'w') as f:
+        f.write(GPS_LOG_HEADER)
+        for start in range(0, len(gps_times), SYNTH_BLOCK_LINES):
+            end = start + SYNTH_BLOCK_LINES
+            f.writelines(f"GPS, {t}, 0, {s}, {g}, 2346, {n}, 0.89, {la:.7f}, {lo:.7f}, {a:.2f}, {SYNTH_SPEED_MPS:.2f}, 255.5, -0.012, 0, 1\n"
+                         for t, s, g, n, la, lo, a in zip(time_us[start:end].tolist(), status[start:end].tolist(),
+                                                          gms[start:end].tolist(), sats[start:end].tolist(),
+                                                          lat[start:end].tolist(), lon[start:end].tolist(),
+                                                          alt[start:end].tolist()))
+    return int((status >= 3).sum())
+
+
+def write_data_file(data_file, data_times, lat, lon, rng, emitters, power_columns=SYNTH_POWER_COLUMNS,
+                    bands=SYNTH_BANDS):
+    line_format = "%09.3f:%04d:%04d: " + " ".join(["%.1f"] * power_columns) + "\n"
+    band_numbers = np.arange(len(data_times)) % len(bands)
+    band_array = np.array(bands, dtype=np.int64)
+    with open(data_file, 'w') as f:
+        for start in range(0, len(data_times), SYNTH_BLOCK_LINES):
+            end = min(start + SYNTH_BLOCK_LINES, len(data_times))
+            powers = rng.normal(-55.0, 4.0, (end - start, power_columns))  # Шум
+            for emitter_lat, emitter_lon, emitter_band, emitter_power in emitters:
+                north = (lat[start:end] - emitter_lat) * METERS_PER_DEGREE
+                east = (lon[start:end] - emitter_lon) * METERS_PER_DEGREE * math.cos(math.radians(emitter_lat))
+                distance = np.maximum(np.hypot(north, east), 1.0)
+                signal = emitter_power - 20.0 * np.log10(distance)
+                on_band = band_numbers[start:end] == emitter_band
+                powers[on_band] = np.maximum(powers[on_band], signal[on_band, None] + rng.normal(0.0, 2.0, (int(on_band.sum()), power_columns)))
+            band = band_array[band_numbers[start:end]]
+            times = SYNTH_DATA_START_SEC + data_times[start:end]
+            f.writelines(line_format % (t, fmin, fmax, *row)
+                         for t, fmin, fmax, row in zip(times.tolist(), band[:, 0].tolist(), band[:, 1].tolist(),
+                                                       np.round(powers, 1).tolist()))
+
+
+# БЛОК 4: Полёт целиком
+def generate_flight(log_file, data_file, duration_sec=SYNTH_DURATION_SEC, gps_rate_hz=SYNTH_GPS_RATE_HZ,
+                    data_rate_hz=SYNTH_DATA_RATE_HZ, power_columns=SYNTH_POWER_COLUMNS, bands=SYNTH_BANDS,
+                    emitter_count=SYNTH_EMITTERS, seed=0):
+    rng = np.random.default_rng(seed)
+    gps_times = np.arange(0.0, duration_sec, 1.0 / gps_rate_hz)
+    data_times = np.arange(0.0, duration_sec, 1.0 / data_rate_hz)
+    gps_lat, gps_lon, gps_alt = flight_path(gps_times, rng)
+    # Координаты в моменты строк данных — по той же траектории
+    data_lat = np.interp(data_times, gps_times, gps_lat)
+    data_lon = np.interp(data_times, gps_times, gps_lon)
+    picks = rng.integers(0, len(gps_times), emitter_count)
+    emitters = [(gps_lat[i] + rng.normal(0.0, 0.002), gps_lon[i] + rng.normal(0.0, 0.002),
+                 int(rng.integers(0, len(bands))), float(rng.uniform(-10.0, 20.0))) for i in picks]
+    good_fixes = write_gps_log(log_file, gps_times, gps_lat, gps_lon, gps_alt, rng)
+    write_data_file(data_file, data_times, data_lat, data_lon, rng, emitters, power_columns, bands)
+    return {"gps_fixes": len(gps_times), "good_fixes": good_fixes, "data_lines": len(data_times)}
+
+
+# БЛОК 5: Запуск из терминала
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Создание искусственной пары файлов .log и .data.")
+    parser.add_argument("base_name", help="начало имён файлов: будут созданы <имя>.log и <имя>.data")
+    parser.add_argument("--duration", type=float, default=SYNTH_DURATION_SEC, help="длительность полёта, с")
+    parser.add_argument("--gps-rate", type=float, default=SYNTH_GPS_RATE_HZ, help="точек GPS в секунду")
+    parser.add_argument("--data-rate", type=float, default=SYNTH_DATA_RATE_HZ, help="строк данных в секунду")
+    parser.add_argument("--power-columns", type=int, default=SYNTH_POWER_COLUMNS, help="значений мощности в строке")
+    parser.add_argument("--emitters", type=int, default=SYNTH_EMITTERS, help="число источников сигнала")
+    parser.add_argument("--seed", type=int, default=0, help="начальное значение генератора случайных чисел")
+    args = parser.parse_args()
+    counts = generate_flight(args.base_name + ".log", args.base_name + ".data", args.duration, args.gps_rate,
+                             args.data_rate, args.power_columns, SYNTH_BANDS, args.emitters, args.seed)
+    print(f"Создано: {counts['gps_fixes']} точек GPS (из них {counts['good_fixes']} с хорошим статусом), "
+          f"{counts['data_lines']} строк данных.")
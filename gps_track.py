@@ -0,0 +1,269 @@
+# Прореживание и упрощение трека GPS: меньше точек для сопоставления и для линии трека на карте.
+# Способы: по времени (не чаще одной точки за интервал), по расстоянию (не ближе заданного шага),
+# Дуглас — Пекер и Висвалингам. Для всех способов действует одна граница ошибки tolerance_m (с учётом высоты):
+# положение на упрощённом треке отходит от любой исходной точки не больше чем на неё. С интерполяцией
+# положение берётся по времени между оставшимися точками (синхронное расстояние), без интерполяции —
+# в ближайшей по времени оставшейся точке, как при сопоставлении. Чтобы сопоставление без интерполяции
+# не теряло измерения, промежутки между оставшимися точками не длиннее max_gap_sec.
+import math  # Для перевода градусов в метры
+import heapq  # Для очереди удаления точек (Висвалингам)
+import logging  # Для записи логов
+
+import numpy as np  # Для координат трека
+
+from gps_matcher import MATCH_TOLERANCE_SEC  # Допуск по времени для сопоставления
+from gps_metrics import stage, count  # Замеры по этапам
+
+# БЛОК 1: Настройки
+TRACK_METHODS = ('time', 'distance', 'dp', 'vw')  # По времени, по расстоянию, Дуглас — Пекер, Висвалингам
+TRACK_TOLERANCE_M = 2.0  # Граница ошибки упрощённого трека, м
+TRACK_INTERVAL_SEC = 1.0  # Интервал для прореживания по времени, с
+TRACK_MIN_DISTANCE_M = 5.0  # Шаг для прореживания по расстоянию, м
+TRACK_MAX_GAP_SEC = 2 * MATCH_TOLERANCE_SEC  # Любое измерение остаётся в пределах допуска от точки трека
+TRACK_DISPLAY_TOLERANCE_M = 1.0  # Граница ошибки линии трека на карте и в KML, м
+METERS_PER_DEGREE = 111320.0  # Метров в градусе широты (как в gps_map, без загрузки folium)
+
+
+# БЛОК 2: Вспомогательные функции
+# Координаты (широта, долгота, высота) в метрах на плоскости около середины трека
+def project(coords):
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    lat0 = float(coords[:, 0].mean()) if len(coords) else 0.0
+    meters_per_lon = METERS_PER_DEGREE * max(math.cos(math.radians(lat0)), 1e-6)
+    return np.column_stack((coords[:, 1] * meters_per_lon, coords[:, 0] * METERS_PER_DEGREE, coords[:, 2]))
+
+
+# Наибольшее синхронное расстояние от точек между a и b до отрезка a-b и номер этой точки
+def _max_deviation(times, xyz, a, b):
+    if b - a < 2:
+        return 0.0, a
+    span = times[b] - times[a]
+    k = (times[a + 1:b] - times[a]) / span if span > 0 else np.zeros(b - a - 1)
+    expected = xyz[a] + (xyz[b] - xyz[a]) * k[:, None]
+    deviation = np.sqrt(((xyz[a + 1:b] - expected) ** 2).sum(axis=1))
+    worst = int(deviation.argmax())
+    return float(deviation[worst]), a + 1 + worst
+
+
+# Добавляет точки внутри промежутков между оставшимися, пока ошибка не уложится в tolerance_m
+def refine(times, xyz, keep, tolerance_m):
+    kept = np.flatnonzero(keep)
+    spans = list(zip(kept[:-1].tolist(), kept[1:].tolist()))
+    while spans:
+        a, b = spans.pop()
+        deviation, worst = _max_deviation(times, xyz, a, b)
+        if deviation > tolerance_m:
+            keep[worst] = True
+            spans.append((a, worst))
+            spans.append((worst, b))
+    return keep
+
+
+# Номера ближайших по времени точек sorted_times для моментов query (при равенстве — левая)
+def nearest_index(sorted_times, query):
+    j = np.searchsorted(sorted_times, query, side='left')
+    left = np.clip(j - 1, 0, len(sorted_times) - 1)
+    right = np.clip(j, 0, len(sorted_times) - 1)
+    use_left = (j >= len(sorted_times)) | ((j > 0) & (query - sorted_times[left] <= sorted_times[right] - query))
+    return np.where(use_left, left, right)
+
+
+# Наибольшее отклонение положения без интерполяции для измерений, ближайших к каждой исходной точке, м:
+# измерение получает ближайшую оставшуюся точку вместо ближайшей исходной. Ближайшая оставшаяся меняется
+# на середине между оставшимися точками, поэтому там проверяются обе соседние оставшиеся
+# (если ближайшая к середине исходная точка сама оставлена, измерение получает её же)
+def nearest_deviation(times, xyz, keep):
+    kept = np.flatnonzero(keep)
+    kept_times = times[kept]
+    deviation = np.sqrt(((xyz - xyz[kept[nearest_index(kept_times, times)]]) ** 2).sum(axis=1))
+    nearest = nearest_index(times, (kept_times[:-1] + kept_times[1:]) / 2)
+    between = ~keep[nearest]
+    nearest = nearest[between]
+    for side in (kept[:-1][between], kept[1:][between]):
+        np.maximum.at(deviation, nearest, np.sqrt(((xyz[nearest] - xyz[side]) ** 2).sum(axis=1)))
+    return deviation
+
+
+# Без интерполяции: оставляет точки, для которых отклонение nearest_deviation больше tolerance_m, пока
+# такие есть (новая оставшаяся точка становится ближайшей и для соседей, поэтому проверка повторяется)
+def refine_nearest(times, xyz, keep, tolerance_m):
+    while True:
+        far = nearest_deviation(times, xyz, keep) > tolerance_m
+        if not far.any():
+            return keep
+        keep[far] = True
+
+
+# Оставляет точку перед каждым промежутком длиннее max_gap_sec
+def limit_gaps(times, keep, max_gap_sec):
+    times = times.tolist()
+    last = times[0]
+    for i in range(1, len(times) - 1):
+        if keep[i]:
+            last = times[i]
+        elif times[i + 1] - last > max_gap_sec:
+            keep[i] = True
+            last = times[i]
+    return keep
+
+
+# БЛОК 3: Способы
+# Первая точка каждого интервала interval_sec
+def decimate_time(times, interval_sec=TRACK_INTERVAL_SEC):
+    keep = np.zeros(len(times), dtype=bool)
+    _, first = np.unique(np.floor((times - times[0]) / interval_sec), return_index=True)
+    keep[first] = True
+    keep[-1] = True
+    return keep
+
+
+# Следующая точка — не ближе min_distance_m от последней оставленной
+def thin_distance(xyz, min_distance_m=TRACK_MIN_DISTANCE_M):
+    keep = np.zeros(len(xyz), dtype=bool)
+    keep[0] = keep[-1] = True
+    last = xyz[0]
+    for i in range(1, len(xyz) - 1):
+        if math.dist(xyz[i], last) >= min_distance_m:
+            keep[i] = True
+            last = xyz[i]
+    return keep
+
+
+# Дуглас — Пекер: от концов трека добавляются самые далёкие точки, пока ошибка больше tolerance_m
+def douglas_peucker(times, xyz, tolerance_m=TRACK_TOLERANCE_M):
+    keep = np.zeros(len(xyz), dtype=bool)
+    keep[0] = keep[-1] = True
+    return refine(times, xyz, keep, tolerance_m)
+
+
+# Площадь треугольника точки i с соседями left и right, м² (points — кортежи координат, без NumPy на точку)
+def _triangle_area(points, left, i, right):
+    (ax, ay, az), (bx, by, bz), (cx, cy, cz) = points[left], points[i], points[right]
+    ux, uy, uz = bx - ax, by - ay, bz - az
+    vx, vy, vz = cx - ax, cy - ay, cz - az
+    return 0.5 * math.sqrt((uy * vz - uz * vy) ** 2 + (uz * vx - ux * vz) ** 2 + (ux * vy - uy * vx) ** 2)
+
+
+# Висвалингам: удаляется точка с наименьшей площадью треугольника с соседями, пока эта площадь
+# меньше tolerance_m². Площадь считается только по трём точкам, поэтому каждое удаление дёшево;
+# граница ошибки по всем исходным точкам обеспечивается одним проходом refine в конце
+def visvalingam(times, xyz, tolerance_m=TRACK_TOLERANCE_M):
+    n = len(xyz)
+    points = [tuple(point) for point in xyz.tolist()]
+    keep = np.ones(n, dtype=bool)
+    previous = list(range(-1, n - 1))
+    following = list(range(1, n + 1))
+    cost = [0.0] * n
+    queue = []
+    for i in range(1, n - 1):
+        cost[i] = _triangle_area(points, i - 1, i, i + 1)
+        queue.append((cost[i], i))
+    heapq.heapify(queue)
+    threshold = tolerance_m ** 2
+    while queue:
+        value, i = heapq.heappop(queue)
+        if not keep[i] or value != cost[i]:
+            continue  # Точка уже удалена или её площадь пересчитана
+        if value > threshold:
+            break
+        keep[i] = False
+        left, right = previous[i], following[i]
+        following[left] = right
+        previous[right] = left
+        for j in (left, right):
+            if 0 < j < n - 1:
+                # Площадь соседа не меньше площади удалённой точки, иначе соседи удаляются не по порядку
+                cost[j] = max(_triangle_area(points, previous[j], j, following[j]), value)
+                heapq.heappush(queue, (cost[j], j))
+    return refine(times, xyz, keep, tolerance_m)
+
+
+# БЛОК 4: Упрощение трека
+# Маска оставляемых точек; times — секунды по возрастанию, coords — (широта, долгота, высота)
+# interpolate — как трек будет использоваться при сопоставлении (от этого зависит, как считается ошибка)
+def simplify_track(times, coords, method='dp', tolerance_m=TRACK_TOLERANCE_M, interval_sec=TRACK_INTERVAL_SEC,
+                   min_distance_m=TRACK_MIN_DISTANCE_M, max_gap_sec=TRACK_MAX_GAP_SEC, interpolate=True):
+    if method not in TRACK_METHODS:
+        raise ValueError(f"Неизвестный способ упрощения трека: '{method}'. Возможные: {', '.join(TRACK_METHODS)}.")
+    times = np.asarray(times, dtype=np.float64)
+    if len(times) < 3:
+        return np.ones(len(times), dtype=bool)
+    xyz = project(coords)
+    if method == 'time':
+        keep = refine(times, xyz, decimate_time(times, interval_sec), tolerance_m)
+    elif method == 'distance':
+        keep = refine(times, xyz, thin_distance(xyz, min_distance_m), tolerance_m)
+    elif method == 'dp':
+        keep = douglas_peucker(times, xyz, tolerance_m)
+    else:
+        keep = visvalingam(times, xyz, tolerance_m)
+    if max_gap_sec:
+        keep = limit_gaps(times, keep, max_gap_sec)
+    if not interpolate:
+        keep = refine_nearest(times, xyz, keep, tolerance_m)
+    return keep
+
+
+# Наибольшее отклонение исходных точек от упрощённого трека, м: положение на треке берётся
+# интерполяцией по времени или ближайшей по времени оставленной точкой, как при сопоставлении
+def track_error(times, coords, keep, interpolate=False):
+    times = np.asarray(times, dtype=np.float64)
+    xyz = project(coords)
+    if not len(times):
+        return 0.0
+    if not interpolate:
+        return float(nearest_deviation(times, xyz, keep).max())
+    kept_times = times[keep]
+    expected = np.column_stack([np.interp(times, kept_times, xyz[keep][:, axis]) for axis in range(3)])
+    return float(np.sqrt(((xyz - expected) ** 2).sum(axis=1)).max())
+
+
+# Обычный шаг между соседними точками трека (медиана), м
+def fix_spacing(coords):
+    xyz = project(coords)
+    return float(np.median(np.sqrt((np.diff(xyz, axis=0) ** 2).sum(axis=1))))
+
+
+# Упрощение перед сопоставлением: оставшиеся время и координаты; track_options — настройки simplify_track
+# Без интерполяции измерение берёт ближайшую оставшуюся точку, поэтому удалить точку можно, только если
+# граница ошибки больше шага между точками; иначе упрощение оставило бы все точки и лишь потратило время
+def reduce_track(times, coords, track_options, interpolate=False):
+    tolerance_m = track_options.get('tolerance_m', TRACK_TOLERANCE_M)
+    if not interpolate and len(times) > 1:
+        spacing = fix_spacing(coords)
+        if tolerance_m < spacing:
+            logging.warning(f"Упрощение трека пропущено: без интерполяции граница {tolerance_m:.2f} м меньше шага "
+                            f"между точками GPS ({spacing:.2f} м). Включите интерполяцию или увеличьте границу.")
+            print(f"Упрощение трека пропущено: граница {tolerance_m:.2f} м меньше шага между точками GPS "
+                  f"({spacing:.2f} м), а интерполяция выключена.")
+            return times, coords
+    with stage("track_simplify"):
+        keep = simplify_track(times, coords, **track_options, interpolate=interpolate)
+        error = track_error(times, coords, keep, interpolate)
+        count("fixes", len(keep))
+        count("kept", int(keep.sum()))
+    logging.info(f"Трек упрощён ('{track_options.get('method', 'dp')}'): осталось {int(keep.sum())} из {len(keep)} "
+                 f"точек GPS, наибольшее отклонение {error:.2f} м.")
+    return times[keep], coords[keep]
+
+
+# БЛОК 5: Параметры для запуска из терминала
+def add_track_arguments(parser):
+    parser.add_argument("--track-simplify", choices=TRACK_METHODS, default=None,
+                        help="упростить трек GPS перед сопоставлением: time — по времени, distance — по расстоянию, "
+                             "dp — Дуглас — Пекер, vw — Висвалингам")
+    parser.add_argument("--track-tolerance", type=float, default=TRACK_TOLERANCE_M,
+                        help="граница ошибки упрощённого трека, м")
+    parser.add_argument("--track-interval", type=float, default=TRACK_INTERVAL_SEC,
+                        help="интервал для прореживания по времени, с")
+    parser.add_argument("--track-min-distance", type=float, default=TRACK_MIN_DISTANCE_M,
+                        help="шаг для прореживания по расстоянию, м")
+    parser.add_argument("--draw-track", action="store_true", help="нарисовать трек полёта линией на карте HTML и в KML")
+
+
+# Настройки упрощения для FlightSession или None, если трек не упрощается
+def track_options_from_args(args):
+    if not args.track_simplify:
+        return None
+    return {"method": args.track_simplify, "tolerance_m": args.track_tolerance,
+            "interval_sec": args.track_interval, "min_distance_m": args.track_min_distance}